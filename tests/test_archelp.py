@@ -0,0 +1,47 @@
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path[:0] = [str(Path(__file__).parents[1]), str(Path(__file__).parents[1] / "utils")]
+
+pytest.importorskip("arcpy")
+
+import utils.archelp as archelp
+
+def _terms(clause: str) -> int:
+    """Count the BETWEEN predicates and IN values in a where clause."""
+
+    in_values = re.search(r"IN \((.*)\)", clause)
+    return clause.count("BETWEEN") + (len(in_values.group(1).split(", ")) if in_values else 0)
+
+def _matched(clause: str) -> set[int]:
+    """Return the OIDs a where clause matches."""
+
+    matched = set()
+    for start, end in re.findall(r"BETWEEN (\d+) AND (\d+)", clause):
+        matched.update(range(int(start), int(end) + 1))
+
+    in_values = re.search(r"IN \((.*)\)", clause)
+    if in_values: matched.update(map(int, in_values.group(1).split(", ")))
+
+    return matched
+
+@pytest.mark.parametrize("max_terms", [1, 2, 3, 1000])
+def test_oid_where_clauses_respects_max_terms(max_terms):
+    # Pairs of consecutive OIDs become two IN values, which used to push a clause one term over the limit
+    oids = [oid for start in range(0, 4 * max_terms + 3, 3) for oid in (start, start + 1)]
+    oids += list(range(10 ** 6, 10 ** 6 + 5))
+
+    clauses = list(archelp.oid_where_clauses(oids, "OBJECTID", max_terms))
+
+    assert all(_terms(clause) <= max_terms for clause in clauses)
+    assert max(_terms(clause) for clause in clauses) == max_terms
+    assert set().union(*map(_matched, clauses)) == set(oids)
+
+def test_oid_where_clauses_exact_boundary():
+    clauses = list(archelp.oid_where_clauses(range(0, 2000, 2), "OBJECTID", 1000))
+
+    assert len(clauses) == 1
+    assert _terms(clauses[0]) == 1000
@@ -0,0 +1,48 @@
+import arcpy
+
+from typing import Any
+
+import utils.archelp as archelp
+import utils.constants as constants
+from utils.tool import Tool
+
+class EditToolDefaults_config(Tool):
+    def __init__(self) -> None:
+        """Edits the default values used by FlickTools tools."""
+
+        # Initialize base class parameters
+        super().__init__()
+
+        # Tool parameters
+        self.label = "Edit Tool Defaults"
+        self.alias = "EditToolDefaults_config"
+        self.description = "Edits the default values used by FlickTools tools."
+        self.category = "Config"
+
+        return
+
+    def getParameterInfo(self) -> list[arcpy.Parameter]:
+        """Define the tool parameters."""
+        return self.ft_config.asParameters()
+
+    def execute(self, parameters: list[arcpy.Parameter], messages: list[Any]) -> None:
+        """The source code of the tool."""
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+
+        # Only write values that changed
+        current_values = self.ft_config.values()
+        changed = {parameter.name: parameter.value for parameter in parameters if parameter.value != current_values.get(parameter.name)}
+
+        if changed:
+            self.ft_config.update(changed)
+
+        # Print the changed values to the geoprocessing pane
+        out_message = [f"{constants.TAB}{name}: {current_values.get(name)} -> {value}" for name, value in changed.items()]
+        self._add_tool_message("\n".join([f"Updated {len(changed)} tool defaults.", *out_message]))
+
+        # Print a random compliment to the geoprocessing pane if asked to
+        self._get_complimented()
+
+        return
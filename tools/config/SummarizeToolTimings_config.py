@@ -0,0 +1,103 @@
+import arcpy
+import os
+
+from typing import Any
+from collections import defaultdict
+
+import utils.archelp as archelp
+import utils.constants as constants
+from utils.tool import Tool
+
+class SummarizeToolTimings_config(Tool):
+    def __init__(self) -> None:
+        """Summarizes the tool timings recorded when instrumentation is turned on."""
+
+        # Initialize base class parameters
+        super().__init__()
+
+        # Tool parameters
+        self.label = "Summarize Tool Timings"
+        self.alias = "SummarizeToolTimings_config"
+        self.description = "Summarizes the tool timings recorded when instrumentation is turned on."
+        self.category = "Config"
+
+        return
+
+    def getParameterInfo(self) -> list[arcpy.Parameter]:
+        """Define the tool parameters."""
+
+        timing_log = arcpy.Parameter(
+            displayName = "Timing Log",
+            name = "timing_log",
+            datatype = "DEFile",
+            parameterType = "Required",
+            direction = "Input"
+        )
+        timing_log.filter.list = ["jsonl"]
+        timing_log.value = self.timing_log_path
+
+        tools = arcpy.Parameter(
+            displayName = "Tools",
+            name = "tools",
+            datatype = "GPString",
+            parameterType = "Optional",
+            direction = "Input",
+            multiValue = True
+        )
+
+        return [timing_log, tools]
+
+    def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
+        """
+        Modify the values and properties of parameters before internal
+        validation is performed.
+        """
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+
+        # List the tools that have timings in the log
+        if parameters.any_changed("timing_log") and os.path.isfile(parameters.timing_log.valueAsText):
+            parameters.tools.filter.list = sorted({event.get("tool") for event in archelp.read_timings(parameters.timing_log.valueAsText) if event.get("tool")})
+
+        return
+
+    def _summarize(self, timing_log: str, tools: list[str] | None) -> dict[str, dict[str, list[float]]]:
+        """Group the durations in a timing log by tool and phase."""
+
+        durations = defaultdict(lambda: defaultdict(list))
+
+        for event in archelp.read_timings(timing_log):
+            if tools and event.get("tool") not in tools: continue
+            durations[event.get("tool")][event.get("phase")].append(float(event.get("seconds", 0)))
+
+        return durations
+
+    def execute(self, parameters: list[arcpy.Parameter], messages: list[Any]) -> None:
+        """The source code of the tool."""
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+        tools = parameters.tools.valueAsText.replace("'", "").split(";") if parameters.tools.valueAsText else None
+
+        # Build a table of call counts and percentiles for each phase of each tool
+        out_message = []
+        header = "Phase|Calls|Total (s)|p50 (s)|p90 (s)|p99 (s)|Max (s)".split("|")
+
+        for tool, phases in sorted(self._summarize(parameters.timing_log.valueAsText, tools).items()):
+            rows = []
+
+            for phase, seconds in sorted(phases.items(), key=lambda item: -sum(item[1])):
+                seconds.sort()
+                rows.append([phase, f"{len(seconds):,}", f"{sum(seconds):.3f}", *[f"{archelp.percentile(seconds, p):.3f}" for p in (50, 90, 99)], f"{seconds[-1]:.3f}"])
+
+            widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+            lines = [f"{constants.TAB}{constants.TAB.join(value.ljust(width) for value, width in zip(row, widths))}" for row in [header, *rows]]
+            out_message.append("\n".join([f"## TOOL: {tool}", *lines]))
+
+        self._add_tool_message("\n\n".join(out_message) if out_message else "No timings found.")
+
+        # Print a random compliment to the geoprocessing pane if asked to
+        self._get_complimented()
+
+        return
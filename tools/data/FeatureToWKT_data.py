@@ -1,11 +1,19 @@
 import arcpy
 import os
+import re
+import json
+import shutil
+import tempfile
+import contextlib
+import numpy as np
 import pandas as pd
 
-from typing import Any
+from typing import Any, Iterator
+from dataclasses import dataclass, replace
+from concurrent.futures import as_completed
 
 import utils.archelp as archelp
-from utils.tool import Tool
+from utils.tool import Tool, validation_step
 
 ###
 #  TODO: 
@@ -15,9 +23,105 @@ from utils.tool import Tool
 #   - Refresh feature selection warning if selection changes
 ###
 
+@dataclass(frozen=True)
+class _OutputOptions():
+    """
+    Settings for turning features into output lines. Only plain values are
+    stored so the options can be sent to worker processes.
+    """
+
+    shape_token: str
+    attribute_fields: tuple[str, ...]
+    output_format: str
+    precision: int
+    output_sr: str
+    cursor_sr: bool
+    transformation: str
+
+def _round_number(number: float, precision: int) -> str:
+    """Round a number and format it without trailing zeros or exponents."""
+
+    text = f"{round(number, precision):.{precision}f}"
+    if "." in text: text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+def _round_wkt(wkt: str, precision: int) -> str:
+    """Round every coordinate in a WKT string."""
+
+    # The only numbers in WKT are coordinate values
+    return re.sub(r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?", lambda match: _round_number(float(match[0]), precision), wkt)
+
+def _round_coordinates(coordinates: Any, precision: int) -> Any:
+    """Round every coordinate in a nested GeoJSON coordinate list."""
+
+    if isinstance(coordinates, (list, tuple)):
+        return [_round_coordinates(c, precision) for c in coordinates]
+    return round(coordinates, precision) if isinstance(coordinates, float) else coordinates
+
+def _format_feature(shape: Any, attributes: dict[str, Any], output_format: str, precision: int, srid: int) -> str:
+    """
+    Convert a feature to a single line of output. The shape can be a WKT
+    string or WKB bytes straight from the cursor, or a geometry object when
+    it needs more work than the cursor can do.
+    """
+
+    match output_format:
+        case "GeoJSON Lines":
+            geometry = shape.__geo_interface__
+            if precision is not None: geometry = {**geometry, "coordinates": _round_coordinates(geometry["coordinates"], precision)}
+            return json.dumps({"type": "Feature", "geometry": geometry, "properties": attributes}, default=str, separators=(",", ":"))
+        case "WKB (hex)":
+            if precision is not None: shape = arcpy.FromWKT(_round_wkt(shape.WKT, precision), shape.spatialReference)
+            return bytes(shape.WKB if isinstance(shape, arcpy.Geometry) else shape).hex()
+        case _:
+            wkt = shape.WKT if isinstance(shape, arcpy.Geometry) else shape
+            if precision is not None: wkt = _round_wkt(wkt, precision)
+            return f"SRID={srid};{wkt}" if output_format == "EWKT" else wkt
+
+def _serialize_features(features: str, options: _OutputOptions, where_clause: str = None, order_by: str = None) -> Iterator[str]:
+    """
+    Yield one output line for each feature, or None for features with no
+    geometry.
+    """
+
+    # Rebuild the output spatial reference from its string form
+    output_sr = arcpy.SpatialReference()
+    output_sr.loadFromString(options.output_sr)
+    fields = [options.shape_token] + list(options.attribute_fields)
+
+    with arcpy.da.SearchCursor(features, fields, where_clause, output_sr if options.cursor_sr else None, sql_clause=(None, order_by)) as cursor:
+        for shape, *attributes in archelp.timed_rows(cursor, "export_cursor"):
+            if shape is None:
+                yield None
+                continue
+
+            if options.transformation: shape = shape.projectAs(output_sr, options.transformation)
+            yield _format_feature(shape, dict(zip(options.attribute_fields, attributes)), options.output_format, options.precision, output_sr.factoryCode)
+
+def _write_part(part_path: str, features: str, where_clauses: list[str], oid_field: str, options: _OutputOptions) -> tuple[int, int]:
+    """
+    Worker process function that writes the features matching a list of
+    where clauses to a part file in OID order. Returns the number of
+    features written and the number of features with no geometry.
+    """
+
+    feature_count, null_count = 0, 0
+
+    with open(part_path, "w", encoding="utf-8", buffering=1 << 20) as outfile:
+        for where_clause in where_clauses:
+            for line in _serialize_features(features, options, where_clause, f"ORDER BY {oid_field}"):
+                if line is None:
+                    null_count += 1
+                    continue
+
+                feature_count += 1
+                outfile.write(f"{line}\n")
+
+    return feature_count, null_count
+
 class FeatureToWKT_data(Tool):
     def __init__(self) -> None:
-        """Converts features in to WKT format."""
+        """Converts features in to WKT, WKB, or GeoJSON formats."""
         
         # Initialize the parent class
         super().__init__()
@@ -25,8 +129,15 @@ class FeatureToWKT_data(Tool):
         # Tool parameters
         self.label = "Feature To WKT"
         self.alias = "FeatureToWKT_data"
-        self.description = "Converts features in to WKT format."
+        self.description = "Converts features in to WKT, WKB, or GeoJSON formats."
         self.category = "Conversion"
+        self.canRunInBackground = True
+
+        # Largest amount of output, in characters, printed to the geoprocessing pane or copied to the clipboard
+        self.preview_size = 1_000_000
+
+        # Output formats and the file extension used for each
+        self.format_extensions = {"WKT": ".txt", "EWKT": ".txt", "WKB (hex)": ".txt", "GeoJSON Lines": ".geojsonl"}
         
         return
     
@@ -49,6 +160,48 @@ class FeatureToWKT_data(Tool):
             direction = "Input"
         )
 
+        transformation = arcpy.Parameter(
+            displayName = "Geographic Transformation",
+            name = "transformation",
+            datatype = "GPString",
+            parameterType = "Optional",
+            direction = "Input",
+            enabled = False
+        )
+        transformation.filter.type = "ValueList"
+
+        output_format = arcpy.Parameter(
+            displayName = "Output Format",
+            name = "output_format",
+            datatype = "GPString",
+            parameterType = "Required",
+            direction = "Input"
+        )
+        output_format.filter.type = "ValueList"
+        output_format.filter.list = list(self.format_extensions.keys())
+        output_format.value = "WKT"
+
+        precision = arcpy.Parameter(
+            displayName = "Coordinate Decimal Places",
+            name = "precision",
+            datatype = "GPLong",
+            parameterType = "Optional",
+            direction = "Input"
+        )
+        precision.filter.type = "Range"
+        precision.filter.list = [0, 15]
+
+        attribute_fields = arcpy.Parameter(
+            displayName = "Attribute Fields",
+            name = "attribute_fields",
+            datatype = "Field",
+            parameterType = "Optional",
+            direction = "Input",
+            multiValue = True,
+            enabled = False
+        )
+        attribute_fields.parameterDependencies = [input_features.name]
+
         clipboard_checkbox = arcpy.Parameter(
             displayName = "Copy output to clipboard",
             name = "clipboard_checkbox",
@@ -70,14 +223,52 @@ class FeatureToWKT_data(Tool):
         output_file = arcpy.Parameter(
             displayName = "Output File",
             name = "output_file",
-            datatype = "DETextfile",
+            datatype = "DEFile",
             parameterType = "Optional",
             direction = "Output",
             enabled = False
         )
         
-        return [input_features, spatial_reference, clipboard_checkbox, file_checkbox, output_file]
+        compression = arcpy.Parameter(
+            displayName = "Output File Compression",
+            name = "compression",
+            datatype = "GPString",
+            parameterType = "Optional",
+            direction = "Input",
+            enabled = False
+        )
+        compression.filter.type = "ValueList"
+        compression.filter.list = ["None"] + archelp.available_compressions()
+        compression.value = "None"
+        
+        parallel_processes = arcpy.Parameter(
+            displayName = "Parallel Processes",
+            name = "parallel_processes",
+            datatype = "GPLong",
+            parameterType = "Optional",
+            direction = "Input",
+            enabled = False
+        )
+        parallel_processes.filter.type = "Range"
+        parallel_processes.filter.list = [1, os.cpu_count() or 1]
+        
+        return [input_features, spatial_reference, transformation, output_format, precision, attribute_fields, clipboard_checkbox, file_checkbox, output_file, compression, parallel_processes]
     
+    @validation_step("input_features")
+    def _input_spatial_reference(self, input_features: str) -> int:
+        """Get the factory code of the input features spatial reference."""
+        return arcpy.Describe(input_features).featureClass.spatialReference.PCSCode
+
+    @validation_step("input_features", "spatial_reference")
+    def _transformations(self, input_features: str, spatial_reference: str) -> list[str]:
+        """List transformations between the input and output spatial references."""
+
+        input_properties = arcpy.Describe(input_features)
+        output_sr = arcpy.SpatialReference()
+        output_sr.loadFromString(spatial_reference)
+
+        return arcpy.ListTransformations(input_properties.featureClass.spatialReference, output_sr, input_properties.extent)
+
     def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
         """ 
         Modify the values and properties of parameters before internal 
@@ -88,18 +279,35 @@ class FeatureToWKT_data(Tool):
         parameters = archelp.Parameters(parameters)
 
         # Update spatial reference to the spatial reference of input features
-        if parameters.input_features.altered and not parameters.input_features.hasBeenValidated:
-            parameters.spatial_reference.value = arcpy.Describe(parameters.input_features.valueAsText).featureClass.spatialReference.PCSCode
+        if parameters.any_changed("input_features"):
+            parameters.spatial_reference.value = self._input_spatial_reference(parameters)
+
+        # List transformations between the input and output spatial references, if there are any
+        if parameters.any_changed("input_features", "spatial_reference") and parameters.input_features.value and parameters.spatial_reference.value:
+            transformations = self._transformations(parameters)
+
+            parameters.transformation.filter.list = transformations
+            parameters.transformation.value = transformations[0] if transformations else None
+            parameters.transformation.enabled = bool(transformations)
+
+        # Attributes can only be included in GeoJSON output
+        parameters.attribute_fields.enabled = parameters.output_format.valueAsText == "GeoJSON Lines"
 
         # Enable or disable output file box depending on whether the checkbox is checked or not
         if parameters.file_checkbox.value:
             parameters.output_file.enabled = True
+            parameters.compression.enabled = True
+            parameters.parallel_processes.enabled = True
 
             if parameters.input_features.altered and not parameters.output_file.altered:
-                file_name = f"{os.path.basename(parameters.input_features.valueAsText)}_FeatureToWKT.txt"
+                extension = self.format_extensions.get(parameters.output_format.valueAsText, ".txt")
+                extension += archelp.COMPRESSION_EXTENSIONS.get(parameters.compression.valueAsText, "")
+                file_name = f"{os.path.basename(parameters.input_features.valueAsText)}_FeatureToWKT{extension}"
                 parameters.output_file.value = os.path.join(self.project_location, file_name)
         elif not parameters.file_checkbox.value:
             parameters.output_file.enabled = False
+            parameters.compression.enabled = False
+            parameters.parallel_processes.enabled = False
         
         return
     
@@ -118,41 +326,207 @@ class FeatureToWKT_data(Tool):
 
         return
 
+    def _read_preview(self, path: str, compression: str, preview_size: int) -> tuple[list[str], bool]:
+        """
+        Read lines from the start of an output file until the preview is full.
+        Also return whether there was more output than fit in the preview.
+        """
+
+        preview, preview_length = [], 0
+
+        with archelp.open_text(path, "r", compression) as infile:
+            for line in infile:
+                line = line.rstrip("\n")
+                if preview_length + len(line) > preview_size: return preview, True
+
+                preview.append(line)
+                preview_length += len(line) + 1
+
+        return preview, False
+
+    def _shape_token(self, output_format: str, precision: int, project_geometries: bool) -> str:
+        """
+        Pick the cursor geometry token. The cursor serializes geometries itself
+        when nothing else needs to be done to them.
+        """
+
+        if project_geometries or output_format == "GeoJSON Lines" or (output_format == "WKB (hex)" and precision is not None):
+            return "SHAPE@"
+
+        return "SHAPE@WKB" if output_format == "WKB (hex)" else "SHAPE@WKT"
+
+    def _write_parallel(self, input_features: str, output_path: str, compression: str, options: "_OutputOptions", workers: int) -> tuple[int, int]:
+        """
+        Serialize features with a pool of worker processes. The OIDs of the
+        input features are split into ranges, each worker writes its ranges
+        to a temporary part file with its own cursor, and the parts are
+        joined in OID order into the output file. Returns the number of
+        features written and the number of features with no geometry.
+        """
+
+        # Read OIDs from the layer so selections and definition queries are respected by the workers
+        properties = arcpy.Describe(input_features)
+        workspace = archelp.get_workspace(input_features)
+        oid_field = arcpy.AddFieldDelimiters(workspace, properties.OIDFieldName)
+
+        with arcpy.da.SearchCursor(input_features, "OID@") as cursor:
+            oids = np.sort(np.fromiter((oid for oid, in archelp.timed_rows(cursor, "oid_cursor")), dtype=np.int64))
+
+        # Split OIDs into a few parts per worker so a slow part doesn't hold up the others
+        parts = np.array_split(oids, min(len(oids), workers * 4)) if len(oids) else []
+        max_terms = archelp.max_where_terms(workspace)
+        temp_folder = tempfile.mkdtemp(prefix="FeatureToWKT_")
+        part_paths = [os.path.join(temp_folder, f"part_{i}.txt") for i in range(len(parts))]
+
+        try:
+            with archelp.process_pool(workers) as pool:
+                futures = [
+                    pool.submit(_write_part, part_path, properties.catalogPath, list(archelp.oid_where_clauses(part.tolist(), oid_field, max_terms)), oid_field, options)
+                    for part_path, part in zip(part_paths, parts)
+                ]
+                counts = [future.result() for future in archelp.progress(as_completed(futures), "Converting features...", len(futures))]
+
+            # Join the parts in order into the output file
+            with archelp.open_text(output_path, "w", compression) as outfile:
+                for part_path in part_paths:
+                    with open(part_path, "r", encoding="utf-8") as part:
+                        shutil.copyfileobj(part, outfile, 1 << 20)
+        finally:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+
+        return sum(c[0] for c in counts), sum(c[1] for c in counts)
+
+    def _project_once(self, scratch: archelp.ScratchWorkspace, features: Any, options: _OutputOptions, shared: bool = False) -> tuple[Any, _OutputOptions]:
+        """
+        Project features that need a transformation into a scratch copy, and
+        return the features to read along with options that no longer
+        transform each geometry. Features without a transformation are
+        returned as they are.
+        """
+
+        if not options.transformation: return features, options
+
+        output_sr = arcpy.SpatialReference()
+        output_sr.loadFromString(options.output_sr)
+        features = scratch.projected(features, output_sr, options.transformation, shared=shared)
+
+        return features, replace(options, shape_token=self._shape_token(options.output_format, options.precision, False), transformation=None)
+
+    def _write_output(self, source: archelp.LayerSource, output_path: str | None, compression: str | None, options: _OutputOptions,
+                      workers: int | None, preview_size: int) -> tuple[list[str], bool, int, int]:
+        """
+        Convert features, writing them to the output file if there is one, and
+        keep a preview of the output. Returns the preview, whether there was
+        more output than fit in the preview, the number of features written,
+        and the number of features with no geometry.
+        """
+
+        preview, preview_length, preview_full = [], 0, False
+        feature_count, null_count = 0, 0
+
+        with source.open() as features:
+            # Write output with worker processes if asked to, then read the preview back from the output file
+            if output_path and workers and workers > 1:
+                with self._scratch_workspace() as scratch:
+                    # Project the features once for all workers instead of having each worker transform every geometry
+                    # Workers run in other processes, so the projected copy can't be kept in the memory workspace
+                    features, options = self._project_once(scratch, features, options, shared=True)
+                    feature_count, null_count = self._write_parallel(features, output_path, compression, options, workers)
+
+                preview, preview_full = self._read_preview(output_path, compression, preview_size)
+
+                return preview, preview_full, feature_count, null_count
+
+            # Otherwise stream features to the output file as the cursor yields them and keep a size bounded preview
+            with self._scratch_workspace() as scratch, archelp.open_text(output_path, "w", compression) if output_path else contextlib.nullcontext() as outfile:
+                # Every feature is read when there is an output file, so project them all at once, in memory if they fit
+                # A preview only reads the first few features, which are cheaper to transform one at a time
+                if output_path: features, options = self._project_once(scratch, features, options)
+
+                for line in archelp.progress(_serialize_features(features, options), "Converting features...", archelp.get_count(features)):
+                    if line is None:
+                        null_count += 1
+                        continue
+
+                    feature_count += 1
+                    if output_path: outfile.write(f"{line}\n")
+
+                    # Stop adding to the preview once it is full, and stop reading entirely if nothing else needs the output
+                    if not preview_full and preview_length + len(line) <= preview_size:
+                        preview.append(line)
+                        preview_length += len(line) + 1
+                    else:
+                        preview_full = True
+                        if not output_path: break
+
+        return preview, preview_full, feature_count, null_count
+
     def execute(self, parameters: list[arcpy.Parameter], messages: list[Any]) -> None:
         """The source code of the tool."""
 
         # Load parameters in a useful format
         parameters = archelp.Parameters(parameters)
 
-        # Reproject features into target coordinate system if necessary
+        # Reproject features into the target coordinate system as they are read if necessary
+        # The cursor can project on its own, but a transformation has to be applied to each geometry
         wkt_features = parameters.input_features.valueAsText
-        scratch_features = []
+        input_sr = arcpy.Describe(wkt_features).featureClass.spatialReference
+        output_sr = parameters.spatial_reference.value
+        transformation = parameters.transformation.valueAsText if parameters.transformation.enabled else None
+        project_geometries, cursor_sr = False, False
+
+        if (input_sr.factoryCode, input_sr.name) != (output_sr.factoryCode, output_sr.name):
+            if transformation:
+                project_geometries = True
+            else:
+                cursor_sr = True
+
+        # Let the cursor serialize geometries when nothing else needs to be done to them
+        output_format = parameters.output_format.valueAsText
+        precision = parameters.precision.value
+        attribute_fields = parameters.attribute_fields.valueAsText.split(";") if parameters.attribute_fields.enabled and parameters.attribute_fields.valueAsText else []
+
+        options = _OutputOptions(
+            shape_token = self._shape_token(output_format, precision, project_geometries),
+            attribute_fields = tuple(attribute_fields),
+            output_format = output_format,
+            precision = precision,
+            output_sr = output_sr.exportToString(),
+            cursor_sr = cursor_sr,
+            transformation = transformation if project_geometries else None
+        )
 
-        if arcpy.Describe(wkt_features).featureClass.spatialReference.PCSCode != parameters.spatial_reference.value.PCSCode:
-            scratch_features = [arcpy.CreateScratchName(suffix=f"_{i}", data_type="FeatureClass", workspace=arcpy.env.scratchGDB) for i in range(2)]
-            arcpy.ExportFeatures_conversion(wkt_features, scratch_features[0])
-            arcpy.Project_management(scratch_features[0], scratch_features[1], parameters.spatial_reference.value.PCSCode)
-            wkt_features = scratch_features[1]
+        # Write output and build the preview, in a worker process if out of process execution is turned on
+        write_file = parameters.file_checkbox.value
+        workers = parameters.parallel_processes.value if parameters.parallel_processes.enabled else None
+        compression = parameters.compression.valueAsText if parameters.compression.valueAsText != "None" else None
+        output_path = archelp.create_file(parameters.output_file.valueAsText) if write_file else None
 
-        # Collect WKT strings
-        with arcpy.da.SearchCursor(wkt_features, ["SHAPE@WKT"]) as cursor:
-            wkt_strings = [row[0] for row in cursor]
+        # The preview is held as text and again as messages, so keep it well inside the memory budget
+        preview_size = min(self.preview_size, self.memory_budget // 8)
+
+        preview, preview_full, feature_count, null_count = self._run_step(
+            self._write_output, archelp.LayerSource(wkt_features), output_path, compression, options, workers, preview_size
+        )
 
         # Print output
-        self._add_tool_message("\n".join(wkt_strings))
+        self._add_tool_message("\n".join(preview))
+
+        if preview_full:
+            self._add_tool_message(
+                f"Output is larger than {preview_size:,} characters. Only the first {len(preview):,} features were printed"
+                f"{' and copied to the clipboard' if parameters.clipboard_checkbox.value else ''}."
+                f"{'' if write_file else ' Use the text file output to convert all features.'}",
+                severity="WARNING"
+            )
+        if null_count:
+            self._add_tool_message(f"Skipped {null_count:,} features with no geometry.", severity="WARNING")
+        if write_file:
+            self._add_tool_message(f"Wrote {feature_count:,} features to {parameters.output_file.valueAsText}.")
 
         # Add output to clipboard
         if parameters.clipboard_checkbox.value:
-            pd.DataFrame(wkt_strings).to_clipboard(excel=False, index=False, header=False)
-
-        # Write output to file
-        if parameters.file_checkbox.value:
-            with open(archelp.create_file(parameters.output_file.valueAsText), "w") as outfile:
-                for wkt in wkt_strings:
-                    outfile.write(f"{wkt}\n")
-
-        # Clean up
-        archelp.delete_scratch_names(scratch_features)
+            pd.DataFrame(preview).to_clipboard(excel=False, index=False, header=False)
 
         # Print a random compliment to the geoprocessing pane if asked to
         self._get_complimented()
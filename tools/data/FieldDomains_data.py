@@ -1,4 +1,9 @@
 import arcpy
+import os
+import itertools
+import numpy as np
+
+from typing import Any
 
 import utils.archelp as archelp
 import utils.constants as constants
@@ -11,9 +16,74 @@ from utils.tool import Tool
 #       - Can probably use the basic version of the formatting function
 #       - Maybe put sorting the list in the formatting funcion
 #   - Can't get domains from rest service endpoints with current setup
-#   - Not sure how this will behave with subtypes
+#   - Resolve subtype domains when reporting selected fields
 ###
 
+def _describe_datasets(datasets: list[str]) -> list[dict[str, Any]]:
+    """
+    Worker process function that describes the fields and subtypes of a
+    list of datasets. Only names are returned, never arcpy objects, so the
+    results can be sent back from worker processes.
+    """
+
+    described = []
+
+    for dataset in datasets:
+        properties = arcpy.Describe(dataset)
+        subtypes = arcpy.da.ListSubtypes(dataset)
+        subtype_field = next(iter(subtypes.values()), {}).get("SubtypeField", "")
+
+        described.append({
+            "dataset": dataset,
+            "fields": [(f.name, f.domain, f.isNullable) for f in properties.fields],
+            "subtype_field": subtype_field,
+            "subtypes": {
+                code: (subtype["Name"], {field: domain.name for field, (_, domain) in subtype["FieldValues"].items() if domain})
+                for code, subtype in subtypes.items()
+            } if subtype_field else {}
+        })
+
+    return described
+
+# Numpy types used to compare the values of each field type against domains
+_FIELD_DTYPES: dict[str, tuple[str, Any]] = {
+    "SmallInteger": ("int64", 0), "Integer": ("int64", 0), "BigInteger": ("int64", 0),
+    "Single": ("float64", 0.0), "Double": ("float64", 0.0),
+    "String": ("str", ""), "Date": ("datetime64[us]", np.datetime64(0, "us"))
+}
+
+def _column_array(values: tuple[Any, ...], field_type: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert one column of cursor values to a typed array and a null mask.
+    Nulls are replaced with a placeholder so the whole column can be typed,
+    and should be ignored using the mask. Unknown field types are compared
+    as python objects.
+    """
+
+    column = np.array(values, dtype=object)
+    nulls = np.equal(column, None)
+
+    if field_type not in _FIELD_DTYPES:
+        return column, nulls
+
+    dtype, placeholder = _FIELD_DTYPES[field_type]
+    column[nulls] = placeholder
+
+    return column.astype(dtype), nulls
+
+def _outside_domain(values: np.ndarray, domain: Any) -> np.ndarray:
+    """Return a mask of values that are not allowed by a coded value or range domain."""
+
+    if domain.domainType == "CodedValue":
+        codes = np.array(list(domain.codedValues.keys()))
+        if values.dtype.kind in "iufM": codes = codes.astype(values.dtype)
+
+        return ~np.isin(values, codes)
+
+    low, high = np.array(domain.range, dtype=values.dtype if values.dtype.kind in "iufM" else object)
+
+    return (values < low) | (values > high)
+
 class FieldDomains_data(Tool):
     def __init__(self) -> None:
         """Displays the domains for one or more fields in a feature."""
@@ -27,6 +97,9 @@ class FieldDomains_data(Tool):
         self.description = "Displays the domains for one or more fields in a feature."
         self.category = "General"
 
+        # Number of rows checked at once when looking for domain violations
+        self.chunk_size = 1_000_000
+
         return
     
     def getParameterInfo(self) -> list:
@@ -35,8 +108,8 @@ class FieldDomains_data(Tool):
         input_features = arcpy.Parameter(
             displayName = "Input Features",
             name = "input_features",
-            datatype = ["GPFeatureLayer", "DEFeatureClass"],
-            parameterType = "Required",
+            datatype = ["GPFeatureLayer", "DEFeatureClass", "GPTableView", "DETable"],
+            parameterType = "Optional",
             direction = "Input"
         )
         
@@ -44,23 +117,351 @@ class FieldDomains_data(Tool):
             displayName = "Field(s)",
             name = "fields",
             datatype = "Field",
-            parameterType = "Required",
+            parameterType = "Optional",
             direction = "Input",
             multiValue = True
         )
         fields.parameterDependencies = [input_features.name]
 
-        return [input_features, fields]
+        # Added after the original parameters so existing scripts and models still pass their arguments to the right parameters
+        report_scope = arcpy.Parameter(
+            displayName = "Report Scope",
+            name = "report_scope",
+            datatype = "GPString",
+            parameterType = "Optional",
+            direction = "Input"
+        )
+        report_scope.filter.type = "ValueList"
+        report_scope.filter.list = ["Selected fields", "Entire geodatabase", "Find domain violations"]
+        report_scope.value = "Selected fields"
+
+        workspace = arcpy.Parameter(
+            displayName = "Geodatabase",
+            name = "workspace",
+            datatype = "DEWorkspace",
+            parameterType = "Optional",
+            direction = "Input",
+            enabled = False
+        )
+        workspace.filter.list = ["Local Database", "Remote Database"]
+
+        output_table = arcpy.Parameter(
+            displayName = "Output Table",
+            name = "output_table",
+            datatype = "DETable",
+            parameterType = "Optional",
+            direction = "Output",
+            enabled = False
+        )
+
+        violation_output = arcpy.Parameter(
+            displayName = "Violation Output",
+            name = "violation_output",
+            datatype = "GPString",
+            parameterType = "Optional",
+            direction = "Input",
+            enabled = False
+        )
+        violation_output.filter.type = "ValueList"
+        violation_output.filter.list = ["Report only", "Select violating rows", "Write violations to table"]
+        violation_output.value = "Report only"
+
+        violation_table = arcpy.Parameter(
+            displayName = "Violations Table",
+            name = "violation_table",
+            datatype = "DETable",
+            parameterType = "Optional",
+            direction = "Output",
+            enabled = False
+        )
+
+        selected_features = arcpy.Parameter(
+            displayName = "Rows With Violations Selected",
+            name = "selected_features",
+            datatype = ["GPFeatureLayer", "GPTableView"],
+            parameterType = "Derived",
+            direction = "Output"
+        )
+        selected_features.parameterDependencies = [input_features.name]
+        selected_features.schema.clone = True
+
+        return [input_features, fields, report_scope, workspace, output_table, violation_output, violation_table, selected_features]
+
+    def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
+        """ 
+        Modify the values and properties of parameters before internal 
+        validation is performed.
+        """
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+
+        # Enable the parameters used by the selected report scope
+        report_geodatabase = parameters.report_scope.valueAsText == "Entire geodatabase"
+        parameters.input_features.enabled = not report_geodatabase
+        parameters.fields.enabled = not report_geodatabase
+        parameters.workspace.enabled = report_geodatabase
+        parameters.output_table.enabled = report_geodatabase
+        parameters.violation_output.enabled = parameters.report_scope.valueAsText == "Find domain violations"
+        parameters.violation_table.enabled = parameters.violation_output.enabled and parameters.violation_output.valueAsText == "Write violations to table"
+
+        # Default to the project geodatabase
+        if report_geodatabase and not parameters.workspace.altered:
+            parameters.workspace.value = self.default_gdb
+
+        # Autogenerate a violations table name if there are input features and violations are written to a table
+        if parameters.violation_table.enabled and parameters.input_features.value and not parameters.violation_table.altered and parameters.any_changed("input_features", "violation_output"):
+            table_name = arcpy.ValidateTableName(f"{os.path.basename(parameters.input_features.valueAsText)}_DomainViolations", self.default_gdb)
+            parameters.violation_table.value = os.path.join(self.default_gdb, table_name)
+
+        return
+
+    def updateMessages(self, parameters: list[arcpy.Parameter]) -> None:
+        """
+        Modify the messages created by internal validation for each tool
+        parameter.
+        """
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+
+        # Parameters are optional so they can be hidden, but each scope needs its own inputs
+        required = ["workspace"] if parameters.report_scope.valueAsText == "Entire geodatabase" else ["input_features", "fields"]
+
+        for name in required:
+            if not parameters[name].valueAsText:
+                parameters[name].setIDMessage("ERROR", 530)
+
+        return
+
+    def _format_domain_values(self, domain: Any) -> str:
+        """Format the values allowed by a domain on a single line."""
+
+        if domain.domainType == "CodedValue":
+            return "; ".join(f"{code}: {description}" for code, description in sorted(domain.codedValues.items(), key=lambda item: str(item[0])))
+        return f"{domain.range[0]} - {domain.range[1]}"
+
+    def _report_geodatabase(self, workspace: str) -> list[tuple[str, str, str, str, str, str]]:
+        """
+        Build a report row for every field with a domain in every feature
+        class and table in a geodatabase. Fields in datasets with subtypes get
+        a row for each subtype using the domain assigned to that subtype.
+        Datasets are described in parallel on large geodatabases, and each
+        domain is only looked up once.
+        """
+
+        # List every feature class and table, including those in feature datasets
+        datasets = [
+            os.path.join(dirpath, name)
+            for dirpath, _, names in arcpy.da.Walk(workspace, datatype=["FeatureClass", "Table"])
+            for name in names
+        ]
+
+        # Starting worker processes takes a few seconds, so only use them when there are enough datasets to make it worthwhile
+        workers = min(os.cpu_count() or 1, 8)
+
+        if len(datasets) >= 50 and workers > 1:
+            chunks = [datasets[i::workers * 4] for i in range(workers * 4)]
+            with archelp.process_pool(workers) as pool:
+                described = [d for chunk in pool.map(_describe_datasets, chunks) for d in chunk]
+        else:
+            described = _describe_datasets(datasets)
+
+        # Resolve domains for each field and subtype
+        domains = archelp.get_domain_index(workspace).domains
+        rows = []
+
+        for info in sorted(described, key=lambda d: d["dataset"].upper()):
+            dataset = os.path.relpath(info["dataset"], workspace)
+            subtypes = info["subtypes"] or {None: (None, {})}
+
+            for code, (subtype_name, subtype_domains) in sorted(subtypes.items(), key=lambda item: (item[0] is not None, item[0])):
+                subtype = f"{code}: {subtype_name}" if code is not None else ""
+
+                for field, field_domain, _ in info["fields"]:
+                    domain = domains.get(subtype_domains.get(field) or field_domain)
+                    if domain is None: continue
+
+                    rows.append((dataset, field, subtype, domain.name, domain.domainType, self._format_domain_values(domain)))
+
+        return rows
+
+    def _write_report_table(self, output_table: str, rows: list[tuple[str, str, str, str, str, str]]) -> None:
+        """
+        Write geodatabase report rows to a table. Field names fit in the 10
+        characters dBASE tables allow, and text is cut to 254 characters in
+        dBASE tables.
+        """
+
+        out_path, out_name = os.path.split(output_table)
+        arcpy.management.CreateTable(out_path, out_name)
+
+        max_length = 254 if getattr(arcpy.Describe(out_path), "workspaceType", None) == "FileSystem" else 8000
+        columns = [["DATASET", "TEXT", "Dataset", 254], ["FIELD", "TEXT", "Field", 254], ["SUBTYPE", "TEXT", "Subtype", 254],
+                   ["DOMAIN", "TEXT", "Domain", 254], ["DOM_TYPE", "TEXT", "Domain Type", 20], ["DOM_VALUES", "TEXT", "Domain Values", max_length]]
+        arcpy.management.AddFields(output_table, columns)
+
+        with arcpy.da.InsertCursor(output_table, [c[0] for c in columns]) as cursor:
+            for row in rows:
+                cursor.insertRow([value[:length] for value, (*_, length) in zip(row, columns)])
+
+        return
+
+    def _violation_rules(self, table: str, field_names: list[str]) -> tuple[str, dict[str, dict[Any, Any]]]:
+        """
+        Find the domain that applies to each field. Tables with subtypes can
+        have a different domain for each subtype, so domains are keyed by
+        subtype code with None for rows that don't have a known subtype.
+        """
+
+        domains = archelp.get_domain_index(archelp.get_workspace(table)).domains
+        field_domains = {f.name: domains.get(f.domain) for f in arcpy.Describe(table).fields if f.name in field_names}
+
+        subtypes = arcpy.da.ListSubtypes(table)
+        subtype_field = next(iter(subtypes.values()), {}).get("SubtypeField", "")
+        rules = {field: {None: domain} for field, domain in field_domains.items()}
+
+        if subtype_field:
+            # A subtype without a domain for a field has no domain, the field's own domain only covers rows without a known subtype
+            for code, subtype in subtypes.items():
+                for field in field_names:
+                    if field not in subtype["FieldValues"]: continue
+
+                    domain = subtype["FieldValues"][field][1]
+                    rules[field][code] = domains.get(domain.name) if domain else None
+
+        return subtype_field, rules
+
+    def _scan_violations(self, table: str, field_names: list[str]) -> tuple[dict[str, dict[str, int]], list[tuple[int, str, str, str]]]:
+        """
+        Find values that break the domain of each field, and nulls in fields
+        that aren't nullable. Rows are read in chunks and each field is checked
+        as a whole column with array operations. Returns counts for each field
+        and a row for each violation.
+        """
+
+        field_info = {f.name: f for f in arcpy.Describe(table).fields if f.name in field_names}
+        subtype_field, rules = self._violation_rules(table, field_names)
+
+        counts = {field: {"Rows checked": 0, "Outside domain": 0, "Null in non-nullable field": 0} for field in field_names}
+        violations = []
+
+        # Read the subtype field once, even when it is also one of the fields being checked
+        cursor_fields = ["OID@", *field_names]
+        if subtype_field and subtype_field not in cursor_fields: cursor_fields.append(subtype_field)
+        subtype_column = cursor_fields.index(subtype_field) if subtype_field else None
+
+        with arcpy.da.SearchCursor(table, cursor_fields) as cursor:
+            while rows := list(itertools.islice(cursor, self.chunk_size)):
+                columns = list(zip(*rows))
+                oids = np.array(columns[0], dtype=np.int64)
+                subtype_codes = np.array(columns[subtype_column], dtype=np.float64) if subtype_field else None
+
+                for index, field in enumerate(field_names, start=1):
+                    values, nulls = _column_array(columns[index], field_info[field].type)
+                    outside = np.zeros(len(rows), dtype=bool)
+
+                    # Check each group of rows against the domain for its subtype
+                    for code, domain in rules[field].items():
+                        if domain is None: continue
+
+                        if subtype_codes is None:
+                            rows_mask = np.ones(len(rows), dtype=bool)
+                        elif code is None:
+                            rows_mask = ~np.isin(subtype_codes, [c for c in rules[field] if c is not None])
+                        else:
+                            rows_mask = subtype_codes == code
+
+                        if rows_mask.any():
+                            outside[rows_mask] = _outside_domain(values[rows_mask], domain)
+
+                    outside &= ~nulls
+                    null_violations = nulls if not field_info[field].isNullable else np.zeros(len(rows), dtype=bool)
+
+                    counts[field]["Rows checked"] += len(rows)
+                    counts[field]["Outside domain"] += int(outside.sum())
+                    counts[field]["Null in non-nullable field"] += int(null_violations.sum())
+
+                    # Keep the details of each violation for the output
+                    raw_values = columns[index]
+                    violations.extend((int(oid), field, str(raw_values[i]), "Outside domain") for i, oid in zip(np.flatnonzero(outside), oids[outside]))
+                    violations.extend((int(oid), field, "<Null>", "Null in non-nullable field") for oid in oids[null_violations])
+
+        return counts, violations
+
+    def _write_violation_table(self, output_table: str, violations: list[tuple[int, str, str, str]]) -> None:
+        """Write domain violations to a table."""
+
+        out_path, out_name = os.path.split(output_table)
+        arcpy.management.CreateTable(out_path, out_name)
+
+        columns = [["SOURCE_OID", "LONG", "Source OID"], ["FIELD", "TEXT", "Field", 255], ["VALUE", "TEXT", "Value", 255], ["REASON", "TEXT", "Reason", 50]]
+        arcpy.management.AddFields(output_table, columns)
+
+        with arcpy.da.InsertCursor(output_table, [c[0] for c in columns]) as cursor:
+            for oid, field, value, reason in violations:
+                cursor.insertRow([oid, field, value[:255], reason])
+
+        return
+
+    def _violation_layer(self, input_features: arcpy.Parameter) -> Any:
+        """
+        Return the layer to select violating rows on. Feature class and table
+        paths don't have a selection, so a layer is made for them and returned
+        through the derived output.
+        """
+
+        data_type = arcpy.Describe(input_features.valueAsText).dataType
+        if data_type in ("FeatureLayer", "TableView"):
+            return input_features.value
+
+        layer_name = f"{os.path.basename(input_features.valueAsText)}_DomainViolations"
+        if data_type == "Table":
+            return arcpy.management.MakeTableView(input_features.valueAsText, layer_name)[0]
+
+        return arcpy.management.MakeFeatureLayer(input_features.valueAsText, layer_name)[0]
 
     def execute(self, parameters:list[arcpy.Parameter], messages:list) -> None:
         """The source code of the tool."""
         
         # Load parameters in a useful format
         parameters = archelp.Parameters(parameters)
+
+        # Report on the whole geodatabase if asked to
+        if parameters.report_scope.valueAsText == "Entire geodatabase":
+            rows = self._report_geodatabase(parameters.workspace.valueAsText)
+
+            if parameters.output_table.valueAsText:
+                self._write_report_table(parameters.output_table.valueAsText, rows)
+
+            out_message = [f"## DATASET: {dataset}\n" + "\n".join(f"{constants.TAB}{field}{f' [{subtype}]' if subtype else ''}: {domain}" for _, field, subtype, domain, *_ in group)
+                           for dataset, group in itertools.groupby(rows, key=lambda row: row[0])]
+            out_message.append(f"Found {len(rows):,} fields with domains in {len(out_message):,} datasets.")
+            self._add_tool_message("\n\n".join(out_message))
+            self._get_complimented()
+
+            return
+
+        # Check field values against their domains if asked to
+        if parameters.report_scope.valueAsText == "Find domain violations":
+            field_names = parameters.fields.valueAsText.split(";")
+            counts, violations = self._scan_violations(parameters.input_features.valueAsText, field_names)
+
+            if parameters.violation_output.valueAsText == "Select violating rows":
+                parameters.selected_features.value = archelp.select_by_oids(self._violation_layer(parameters.input_features), sorted({v[0] for v in violations}))
+            elif parameters.violation_output.valueAsText == "Write violations to table":
+                self._write_violation_table(parameters.violation_table.valueAsText, violations)
+
+            out_message = ["\n".join([f"## FIELD: {field}", *[f"{constants.TAB}{label}: {count:,}" for label, count in counts[field].items()]]) for field in field_names]
+            out_message.append(f"Found {len(violations):,} domain violations in {len({v[0] for v in violations}):,} rows.")
+            self._add_tool_message("\n\n".join(out_message), severity="WARNING" if violations else "INFO")
+            self._get_complimented()
+
+            return
       
         # Get all domains objects and filtered field objects in input features
         feature_properties = arcpy.Describe(parameters.input_features.valueAsText)
-        domains = {d.name: d for d in arcpy.da.ListDomains(feature_properties.path)}
+        domains = archelp.get_domain_index(archelp.get_workspace(parameters.input_features.valueAsText)).domains
         fields = dict(sorted({f.aliasName: f for f in feature_properties.fields if f.name in parameters.fields.valueAsText.split(";")}.items())).values()
 
         # Build output for each input field
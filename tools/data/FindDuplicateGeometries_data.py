@@ -0,0 +1,246 @@
+import arcpy
+import json
+import hashlib
+
+from typing import Any
+
+import utils.archelp as archelp
+from utils.tool import Tool, validation_step
+
+###
+#  TODO:
+#   - Add option to zoom to duplicate features
+###
+
+class FindDuplicateGeometries_data(Tool):
+    def __init__(self) -> None:
+        """Finds features with duplicate or nearly duplicate geometries."""
+
+        # Initialize the parent class
+        super().__init__()
+
+        # Tool parameters
+        self.label = "Find Duplicate Geometries"
+        self.alias = "FindDuplicateGeometries_data"
+        self.description = "Finds features with duplicate or nearly duplicate geometries."
+        self.category = "General"
+
+        return
+
+    def getParameterInfo(self) -> list[arcpy.Parameter]:
+        """Define the tool parameters."""
+
+        input_features = arcpy.Parameter(
+            displayName = "Input Features",
+            name = "input_features",
+            datatype = "GPFeatureLayer",
+            parameterType = "Required",
+            direction = "Input"
+        )
+
+        tolerance = arcpy.Parameter(
+            displayName = "XY Tolerance",
+            name = "tolerance",
+            datatype = "GPDouble",
+            parameterType = "Required",
+            direction = "Input"
+        )
+
+        output_mode = arcpy.Parameter(
+            displayName = "Output",
+            name = "output_mode",
+            datatype = "GPString",
+            parameterType = "Required",
+            direction = "Input"
+        )
+        output_mode.filter.type = "ValueList"
+        output_mode.filter.list = ["Select duplicates", "Add group ID field"]
+        output_mode.value = "Select duplicates"
+
+        group_field = arcpy.Parameter(
+            displayName = "Group ID Field Name",
+            name = "group_field",
+            datatype = "GPString",
+            parameterType = "Optional",
+            direction = "Input",
+            enabled = False
+        )
+        group_field.value = "DUP_GROUP"
+
+        group_count = arcpy.Parameter(
+            displayName = "Duplicate Groups",
+            name = "group_count",
+            datatype = "GPLong",
+            parameterType = "Derived",
+            direction = "Output"
+        )
+
+        output_features = arcpy.Parameter(
+            displayName = "Updated Features",
+            name = "output_features",
+            datatype = "GPFeatureLayer",
+            parameterType = "Derived",
+            direction = "Output"
+        )
+        output_features.parameterDependencies = [input_features.name]
+        output_features.schema.clone = True
+
+        return [input_features, tolerance, output_mode, group_field, group_count, output_features]
+
+    @validation_step("input_features")
+    def _default_tolerance(self, input_features: str) -> float:
+        """Get the XY tolerance of the input features."""
+        return arcpy.Describe(input_features).spatialReference.XYTolerance
+
+    def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
+        """
+        Modify the values and properties of parameters before internal
+        validation is performed.
+        """
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+
+        # Default the tolerance to the XY tolerance of the input features
+        if parameters.any_changed("input_features") and not parameters.tolerance.altered:
+            parameters.tolerance.value = self._default_tolerance(parameters)
+
+        # Only enable the field name when a field will be added
+        parameters.group_field.enabled = parameters.output_mode.valueAsText == "Add group ID field"
+
+        return
+
+    def updateMessages(self, parameters: list[arcpy.Parameter]) -> None:
+        """
+        Modify the messages created by internal validation for each tool
+        parameter.
+        """
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+
+        # Coordinates are divided by the tolerance, so it has to be positive
+        if parameters.tolerance.value is not None and parameters.tolerance.value <= 0:
+            parameters.tolerance.setErrorMessage("XY Tolerance must be greater than zero.")
+
+        return
+
+    def _canonical_part(self, coordinates: list[list[float]], tolerance: float, closed: bool) -> tuple[tuple[int, int], ...]:
+        """
+        Snap a ring or path to the tolerance grid and put it in a canonical
+        form. Rings start at their smallest vertex and paths start at their
+        smallest end, in whichever direction gives the smaller sequence, so
+        the same shape always has the same form no matter how it was drawn.
+        """
+
+        # Snap vertices to the grid and drop repeated vertices created by snapping
+        points = []
+
+        for coordinate in coordinates:
+            point = (round(coordinate[0] / tolerance), round(coordinate[1] / tolerance))
+            if not points or point != points[-1]: points.append(point)
+
+        if not closed:
+            return min(tuple(points), tuple(reversed(points)))
+
+        # Rings repeat their first vertex at the end, which doesn't matter once the start is canonical
+        while len(points) > 1 and points[0] == points[-1]:
+            points.pop()
+
+        # Try every rotation that starts at the smallest vertex, in both directions
+        smallest = min(points)
+        candidates = []
+
+        for sequence in (points, points[::-1]):
+            for i, point in enumerate(sequence):
+                if point == smallest: candidates.append(tuple(sequence[i:] + sequence[:i]))
+
+        return min(candidates)
+
+    def _geometry_hash(self, esri_json: str, tolerance: float) -> bytes:
+        """
+        Hash the canonical form of a geometry given as Esri JSON. Geometries
+        that are the same within the tolerance have the same hash. Returns
+        None for empty geometries.
+        """
+
+        geometry = json.loads(esri_json)
+
+        # Build a canonical form for each geometry type, with parts sorted so part order doesn't matter
+        if "rings" in geometry:
+            canonical = ("rings", tuple(sorted(self._canonical_part(ring, tolerance, True) for ring in geometry["rings"])))
+        elif "paths" in geometry:
+            canonical = ("paths", tuple(sorted(self._canonical_part(path, tolerance, False) for path in geometry["paths"])))
+        elif "points" in geometry:
+            canonical = ("points", tuple(sorted((round(p[0] / tolerance), round(p[1] / tolerance)) for p in geometry["points"])))
+        elif geometry.get("x") is not None:
+            canonical = ("point", (round(geometry["x"] / tolerance), round(geometry["y"] / tolerance)))
+        else:
+            return None
+
+        if not canonical[1]: return None
+
+        return hashlib.blake2b(repr(canonical).encode(), digest_size=16).digest()
+
+    def _find_duplicates(self, input_features: str, tolerance: float) -> list[list[int]]:
+        """
+        Find groups of features with the same geometry in a single cursor
+        pass. Only a hash and the first OID are kept for each unique geometry,
+        plus the OIDs of features that turn out to be duplicates.
+        """
+
+        first_oids, groups = {}, {}
+
+        with arcpy.da.SearchCursor(input_features, ["OID@", "SHAPE@JSON"]) as cursor:
+            for oid, esri_json in archelp.progress(archelp.timed_rows(cursor, "hash_cursor"), "Hashing geometries...", archelp.get_count(input_features)):
+                if not esri_json: continue
+
+                digest = self._geometry_hash(esri_json, tolerance)
+                if digest is None: continue
+
+                # Start a group the second time a hash is seen
+                if digest in groups:
+                    groups[digest].append(oid)
+                elif digest in first_oids:
+                    groups[digest] = [first_oids.pop(digest), oid]
+                else:
+                    first_oids[digest] = oid
+
+        return sorted(sorted(group) for group in groups.values())
+
+    def execute(self, parameters: list[arcpy.Parameter], messages: list[Any]) -> None:
+        """The source code of the tool."""
+
+        # Load parameters and define helpful variables
+        parameters = archelp.Parameters(parameters)
+        input_features = parameters.input_features.valueAsText
+
+        # Find duplicate groups
+        groups = self._find_duplicates(input_features, parameters.tolerance.value)
+
+        # Write the group ID of each duplicate to a field, leaving it null for unique geometries
+        if parameters.output_mode.valueAsText == "Add group ID field":
+            group_field = parameters.group_field.valueAsText
+            group_ids = {oid: group_id for group_id, group in enumerate(groups, start=1) for oid in group}
+
+            if group_field not in [f.name for f in arcpy.ListFields(input_features)]:
+                arcpy.management.AddField(input_features, group_field, "LONG")
+
+            with arcpy.da.UpdateCursor(input_features, ["OID@", group_field]) as cursor:
+                for oid, group_id in cursor:
+                    if group_ids.get(oid) != group_id: cursor.updateRow([oid, group_ids.get(oid)])
+
+            parameters.output_features.value = parameters.input_features.value
+
+        # Otherwise select every duplicate feature
+        else:
+            parameters.output_features.value = archelp.select_by_oids(parameters.input_features.value, [oid for group in groups for oid in group])
+
+        # Update derived parameters and print message to geoprocessing window
+        parameters.group_count.value = len(groups)
+        self._add_tool_message(f"Found {len(groups):,} groups of duplicate geometries with {sum(len(g) for g in groups):,} features.")
+
+        # Print a random compliment to the geoprocessing pane if asked to
+        self._get_complimented()
+
+        return
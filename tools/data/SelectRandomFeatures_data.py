@@ -1,7 +1,12 @@
 import arcpy
+import math
+import heapq
+import array
 import random
+import itertools
+import numpy as np
 
-from typing import Any
+from typing import Any, Iterable
 
 import utils.archelp as archelp
 from utils.tool import Tool
@@ -12,6 +17,130 @@ from utils.tool import Tool
 #   - Refresh the subset count check when feature selection changes
 ###
 
+def _open_uniform(rng: random.Random) -> float:
+    """Return a random float in the open interval (0, 1)."""
+
+    # random() can return exactly 0.0, which would break the logarithms in the reservoir samplers
+    while True:
+        u = rng.random()
+        if u > 0.0: return u
+
+# All 24 orderings of the four quadrants, used to randomize the traversal of each grid cell
+_QUADRANT_PERMUTATIONS = np.array(list(itertools.permutations(range(4))), dtype=np.uint64)
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """Hash an array of unsigned 64 bit integers with the SplitMix64 finalizer."""
+
+    z = values + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+class _UniformReservoir():
+    """
+    Streaming uniform sample of k items using Algorithm L (Li, 1994). Items
+    are offered one at a time, so several reservoirs can be filled from a
+    single cursor pass.
+    """
+
+    __slots__ = ("k", "rng", "items", "seen", "w", "skip")
+
+    def __init__(self, k: int, rng: random.Random) -> None:
+        self.k = k
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+        self.w = 1.0
+        self.skip = 0
+        return
+
+    def _next_skip(self) -> None:
+        """Advance the threshold and draw the number of items to skip."""
+
+        self.w *= math.exp(math.log(_open_uniform(self.rng)) / self.k)
+        self.skip = math.floor(math.log(_open_uniform(self.rng)) / math.log1p(-self.w))
+        return
+
+    def offer(self, item: Any) -> None:
+        """Offer an item to the reservoir."""
+
+        self.seen += 1
+        if self.k == 0: return
+
+        # Fill the reservoir, then only stop for an item once the skip count runs out
+        if len(self.items) < self.k:
+            self.items.append(item)
+            if len(self.items) == self.k: self._next_skip()
+        elif self.skip > 0:
+            self.skip -= 1
+        else:
+            self.items[self.rng.randrange(self.k)] = item
+            self._next_skip()
+
+        return
+
+    def sample(self, count: int = None) -> list[Any]:
+        """Return the sample, or a random subset of it if a smaller count is given."""
+
+        if count is None or count >= len(self.items):
+            return list(self.items)
+        return self.rng.sample(self.items, count)
+
+class _WeightedReservoir():
+    """
+    Streaming weighted sample of k items without replacement using the
+    A-ExpJ algorithm (Efraimidis and Spirakis, 2006). Items with a missing
+    or non-positive weight are never selected.
+    """
+
+    __slots__ = ("k", "rng", "heap", "seen", "remaining", "counter")
+
+    def __init__(self, k: int, rng: random.Random) -> None:
+        self.k = k
+        self.rng = rng
+        self.heap = []
+        self.seen = 0
+        self.remaining = 0.0
+        self.counter = itertools.count()
+        return
+
+    def _next_jump(self) -> None:
+        """Draw the amount of weight to skip before the next replacement."""
+
+        # Keys are stored as log(u) / weight, so the smallest key in the heap is log(T_w)
+        self.remaining = math.log(_open_uniform(self.rng)) / self.heap[0][0]
+        return
+
+    def offer(self, item: Any, weight: float) -> None:
+        """Offer an item with a weight to the reservoir."""
+
+        self.seen += 1
+        if weight is None or weight <= 0 or self.k == 0: return
+
+        # Fill the reservoir with keyed items, then jump over weight until the next replacement
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (math.log(_open_uniform(self.rng)) / weight, next(self.counter), item))
+            if len(self.heap) == self.k: self._next_jump()
+            return
+
+        self.remaining -= weight
+        if self.remaining > 0: return
+
+        # The replacing item gets a key drawn from the part of its distribution above the current threshold
+        threshold = math.exp(self.heap[0][0] * weight)
+        key = math.log(self.rng.uniform(threshold, 1.0)) / weight
+        heapq.heapreplace(self.heap, (key, next(self.counter), item))
+        self._next_jump()
+
+        return
+
+    def sample(self, count: int = None) -> list[Any]:
+        """Return the sample, or the highest keyed subset of it if a smaller count is given."""
+
+        if count is None or count >= len(self.heap):
+            return [item for *_, item in self.heap]
+        return [item for *_, item in heapq.nlargest(count, self.heap)]
+
 class SelectRandomFeatures_data(Tool):
     def __init__(self) -> None:
         """Selects a random subset of rows in a given feature."""
@@ -24,6 +153,9 @@ class SelectRandomFeatures_data(Tool):
         self.alias = "SelectRandomFeatures_data"
         self.description = "Selects a random subset of rows in a given feature."
         self.category = "Selection"
+
+        # Rough bytes held for each feature by the spatially balanced sample, for the arrays and sorting
+        self.spatial_bytes_per_feature = 80
         
         return
     
@@ -46,6 +178,57 @@ class SelectRandomFeatures_data(Tool):
             direction = "Input"
         )
         
+        sampling_method = arcpy.Parameter(
+            displayName = "Sampling Method",
+            name = "sampling_method",
+            datatype = "GPString",
+            parameterType = "Optional",
+            direction = "Input"
+        )
+        sampling_method.filter.type = "ValueList"
+        sampling_method.filter.list = ["Uniform", "Weighted", "Spatially Balanced"]
+        sampling_method.value = "Uniform"
+
+        weight_field = arcpy.Parameter(
+            displayName = "Weight Field",
+            name = "weight_field",
+            datatype = "Field",
+            parameterType = "Optional",
+            direction = "Input",
+            enabled = False
+        )
+        weight_field.parameterDependencies = [input_feautres.name]
+        weight_field.filter.list = ["Short", "Long", "BigInteger", "Float", "Double"]
+
+        strata_field = arcpy.Parameter(
+            displayName = "Strata Field",
+            name = "strata_field",
+            datatype = "Field",
+            parameterType = "Optional",
+            direction = "Input"
+        )
+        strata_field.parameterDependencies = [input_feautres.name]
+
+        strata_allocation = arcpy.Parameter(
+            displayName = "Strata Allocation",
+            name = "strata_allocation",
+            datatype = "GPString",
+            parameterType = "Optional",
+            direction = "Input",
+            enabled = False
+        )
+        strata_allocation.filter.type = "ValueList"
+        strata_allocation.filter.list = ["Count per stratum", "Proportional to stratum size"]
+        strata_allocation.value = "Count per stratum"
+
+        seed = arcpy.Parameter(
+            displayName = "Random Seed",
+            name = "seed",
+            datatype = "GPLong",
+            parameterType = "Optional",
+            direction = "Input"
+        )
+
         selected_count = arcpy.Parameter(
             displayName = "Count",
             name = "selected_count",
@@ -64,7 +247,22 @@ class SelectRandomFeatures_data(Tool):
         selected_feautres.parameterDependencies = [input_feautres.name]
         selected_feautres.schema.clone = True
 
-        return [input_feautres, subset_count, selected_count, selected_feautres]
+        return [input_feautres, subset_count, sampling_method, weight_field, strata_field, strata_allocation, seed, selected_count, selected_feautres]
+
+    def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
+        """
+        Modify the values and properties of parameters before internal
+        validation is performed.
+        """
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+
+        # Only enable the weight field and strata allocation when they will be used
+        parameters.weight_field.enabled = parameters.sampling_method.valueAsText == "Weighted"
+        parameters.strata_allocation.enabled = bool(parameters.strata_field.valueAsText)
+
+        return
 
     def updateMessages(self, parameters: list[arcpy.Parameter]) -> None:
         """
@@ -76,15 +274,261 @@ class SelectRandomFeatures_data(Tool):
         parameters = archelp.Parameters(parameters)
 
         # Check if subset count is greater then the count of features in input features
-        if parameters.input_features.altered and parameters.subset_count.altered:
-            count_input_features = int(arcpy.management.GetCount(parameters.input_features.valueAsText)[0])
+        # Strata smaller than the subset count are selected in full, so there is nothing to check when stratifying
+        if parameters.input_features.altered and parameters.subset_count.altered and not parameters.strata_field.valueAsText:
+            count_input_features = archelp.get_count(parameters.input_features.valueAsText)
             subset_count = int(parameters.subset_count.valueAsText)
 
             if subset_count > count_input_features:
                 parameters.subset_count.setErrorMessage(f"Subset Count is greater than the number of rows in Input Features [{count_input_features}].")
 
+        # Weighted sampling needs a field to weight by
+        if parameters.sampling_method.valueAsText == "Weighted" and not parameters.weight_field.valueAsText:
+            parameters.weight_field.setErrorMessage("A Weight Field is required for weighted sampling.")
+
         return
 
+    def _oid_range(self, input_features: str, oid_field: str) -> tuple[int, int]:
+        """
+        Return the smallest and largest OID in the input features using
+        ordered single row cursors.
+        """
+
+        # Only the first row of each cursor is read, the database does the sorting using the OID index
+        bounds = []
+
+        for order in ["ASC", "DESC"]:
+            with arcpy.da.SearchCursor(input_features, "OID@", sql_clause=(None, f"ORDER BY {oid_field} {order}")) as cursor:
+                bounds.append(next(iter(cursor), (None,))[0])
+
+        return tuple(bounds)
+
+    def _reservoir_sample(self, iterable: Iterable[Any], k: int, rng: random.Random) -> list[Any]:
+        """
+        Select k random items from an iterable in a single pass while only
+        holding k items in memory, using the same uniform reservoir as the
+        stratified sample.
+        """
+
+        reservoir = _UniformReservoir(k, rng)
+
+        for item in iterable:
+            reservoir.offer(item)
+
+        return reservoir.sample()
+
+    def _sample_oids(self, input_features: str, oid_field: str, subset_count: int, rng: random.Random) -> list[int]:
+        """
+        Sample OIDs from the input features. If the OIDs form a dense range the
+        sample is drawn directly from that range, otherwise the OIDs are
+        streamed through a reservoir sampler.
+        """
+
+        # OIDs are unique, so if the count matches the width of the OID range every OID in the range exists
+        # Always use a fresh count here because a stale one could select OIDs that no longer exist
+        count_input_features = archelp.get_count(input_features, refresh=True)
+        min_oid, max_oid = self._oid_range(input_features, oid_field)
+
+        if min_oid is not None and max_oid - min_oid + 1 == count_input_features:
+            return rng.sample(range(min_oid, max_oid + 1), subset_count)
+
+        with arcpy.da.SearchCursor(input_features, "OID@") as cursor:
+            return [oid for oid, in self._reservoir_sample(archelp.timed_rows(cursor, "sample_cursor"), subset_count, rng)]
+
+    def _allocate_proportional(self, stratum_sizes: dict[Any, int], subset_count: int) -> dict[Any, int]:
+        """
+        Split the subset count across strata in proportion to their sizes
+        using largest remainder rounding, so the allocations add up to the
+        subset count.
+        """
+
+        total = sum(stratum_sizes.values())
+        if total == 0: return {stratum: 0 for stratum in stratum_sizes}
+
+        # Floor each share, then hand the leftover counts to the largest remainders
+        shares = {stratum: min(subset_count, total) * size / total for stratum, size in stratum_sizes.items()}
+        allocation = {stratum: int(share) for stratum, share in shares.items()}
+        leftover = min(subset_count, total) - sum(allocation.values())
+
+        for stratum in sorted(shares, key=lambda s: shares[s] - allocation[s], reverse=True)[:leftover]:
+            allocation[stratum] += 1
+
+        return allocation
+
+    def _sample_streaming(self, input_features: str, subset_count: int, rng: random.Random, weight_field: str = None,
+                          strata_field: str = None, proportional: bool = False) -> list[int]:
+        """
+        Sample OIDs in one cursor pass with a reservoir for each stratum.
+        Reservoirs are weighted if a weight field is given. With proportional
+        allocation each reservoir holds up to the full subset count and is
+        cut down to its share once the stratum sizes are known.
+        """
+
+        # Build the cursor fields and a reservoir factory for the sampling method
+        fields = ["OID@"] + [field for field in [strata_field, weight_field] if field]
+        reservoir_type = _WeightedReservoir if weight_field else _UniformReservoir
+        reservoirs = {}
+
+        # Offer every row to the reservoir for its stratum
+        with arcpy.da.SearchCursor(input_features, fields) as cursor:
+            for row in archelp.timed_rows(cursor, "sample_cursor"):
+                stratum = row[1] if strata_field else None
+
+                if stratum not in reservoirs:
+                    reservoirs[stratum] = reservoir_type(subset_count, rng)
+
+                if weight_field:
+                    reservoirs[stratum].offer(row[0], row[-1])
+                else:
+                    reservoirs[stratum].offer(row[0])
+
+        # Work out how many OIDs to take from each reservoir
+        if strata_field and proportional:
+            allocation = self._allocate_proportional({stratum: r.seen for stratum, r in reservoirs.items()}, subset_count)
+        else:
+            allocation = {stratum: subset_count for stratum in reservoirs}
+
+        return [oid for stratum, reservoir in reservoirs.items() for oid in reservoir.sample(allocation[stratum])]
+
+    def _grid_addresses(self, x: np.ndarray, y: np.ndarray, rng: random.Random, depth: int = 16) -> np.ndarray:
+        """
+        Bin points into a quadtree grid and return a hierarchically randomized
+        address for each point.
+
+        Each level of the address is the quadrant the point falls in, with the
+        order of the quadrants shuffled separately for every parent cell. The
+        shuffle is derived from a hash of the parent cell, so no per-cell state
+        is kept. Sorting by address walks the grid along a randomized
+        space-filling curve, which is the ordering used by GRTS.
+        """
+
+        # Scale coordinates onto an integer grid covering the extent of the points
+        cells = (1 << depth) - 1
+        span = max(float(np.ptp(x)), float(np.ptp(y))) or 1.0
+        ix = ((x - x.min()) / span * cells).astype(np.uint64)
+        iy = ((y - y.min()) / span * cells).astype(np.uint64)
+
+        # Build the address one level at a time, from the coarsest cells to the finest
+        salt = np.uint64(rng.getrandbits(64))
+        parents = np.zeros(len(x), dtype=np.uint64)
+        addresses = np.zeros(len(x), dtype=np.uint64)
+
+        for level in range(depth):
+            shift = np.uint64(depth - 1 - level)
+            quadrants = ((ix >> shift) & np.uint64(1)) << np.uint64(1) | ((iy >> shift) & np.uint64(1))
+            permutations = _mix64(parents ^ salt ^ np.uint64(level << 58)) % np.uint64(len(_QUADRANT_PERMUTATIONS))
+            addresses = (addresses << np.uint64(2)) | _QUADRANT_PERMUTATIONS[permutations, quadrants]
+            parents = (parents << np.uint64(2)) | quadrants
+
+        return addresses
+
+    def _balanced_positions(self, addresses: np.ndarray, count: int, np_rng: np.random.Generator, depth: int = 16) -> np.ndarray:
+        """
+        Pick positions from a sorted array of grid addresses so that the picks
+        are spread across occupied grid cells rather than across points.
+
+        The coarsest grid level with at least count occupied cells is used.
+        Cells are picked systematically along the randomized curve and one
+        random point is taken from each picked cell.
+        """
+
+        # Find the first point in each occupied cell, refining the grid until there are enough cells
+        for level in range(1, depth + 1):
+            prefixes = addresses >> np.uint64(2 * (depth - level))
+            starts = np.flatnonzero(np.r_[True, prefixes[1:] != prefixes[:-1]])
+            if len(starts) >= count: break
+        else:
+            starts = np.arange(len(addresses))
+
+        # Systematic sample of cells with a random start, then a random point inside each cell
+        step = len(starts) / count
+        cells = (np_rng.uniform(0, step) + step * np.arange(count)).astype(np.int64)
+        cell_sizes = np.diff(np.r_[starts, len(addresses)])
+
+        return starts[cells] + (np_rng.random(count) * cell_sizes[cells]).astype(np.int64)
+
+    def _sample_spatially_balanced(self, input_features: str, subset_count: int, rng: random.Random,
+                                   strata_field: str = None, proportional: bool = False, keep_rate: float = 1.0) -> list[int]:
+        """
+        Draw a spatially balanced sample using a hierarchical grid index.
+        Feature centroids are read in one cursor pass, ordered along a
+        randomized quadtree curve in the style of GRTS and sampled across grid
+        cells, so dense areas can't crowd out the rest of the extent. Runs in
+        near-linear time with no pairwise distance calculations.
+
+        When there are too many features to hold in memory, a keep rate below
+        one thins the features at random as they are read, which keeps the
+        sample close to balanced with a fraction of the memory.
+        """
+
+        # Read OIDs, centroids and strata into compact arrays
+        oids, xs, ys, strata = array.array("q"), array.array("d"), array.array("d"), array.array("q")
+        stratum_codes = {}
+        fields = ["OID@", "SHAPE@XY"] + ([strata_field] if strata_field else [])
+
+        with arcpy.da.SearchCursor(input_features, fields) as cursor:
+            for row in archelp.timed_rows(cursor, "point_cursor"):
+                x, y = row[1]
+                if x is None or y is None: continue
+                if keep_rate < 1 and rng.random() >= keep_rate: continue
+
+                oids.append(row[0])
+                xs.append(x)
+                ys.append(y)
+                strata.append(stratum_codes.setdefault(row[2] if strata_field else None, len(stratum_codes)))
+
+        if not oids: return []
+
+        # Order points by stratum, then address, breaking ties inside the finest cells randomly
+        np_rng = np.random.default_rng(rng.getrandbits(64))
+        oids, strata = np.frombuffer(oids, dtype=np.int64), np.frombuffer(strata, dtype=np.int64)
+        addresses = self._grid_addresses(np.frombuffer(xs, dtype=np.float64), np.frombuffer(ys, dtype=np.float64), rng)
+        order = np.lexsort((np_rng.random(len(oids)), addresses, strata))
+
+        # Work out how many OIDs to take from each stratum
+        stratum_sizes = np.bincount(strata, minlength=len(stratum_codes))
+
+        if strata_field and proportional:
+            allocation = self._allocate_proportional(dict(enumerate(stratum_sizes.tolist())), subset_count)
+        else:
+            allocation = {stratum: min(subset_count, size) for stratum, size in enumerate(stratum_sizes.tolist())}
+
+        # Sample across the grid cells of each stratum
+        sampled = []
+        start = 0
+
+        for stratum, size in enumerate(stratum_sizes.tolist()):
+            stratum_order = order[start:start + size]
+            if allocation[stratum]:
+                positions = self._balanced_positions(addresses[stratum_order], allocation[stratum], np_rng)
+                sampled.append(oids[stratum_order[positions]])
+            start += size
+
+        return np.concatenate(sampled).tolist() if sampled else []
+
+    def _spatial_keep_rate(self, input_features: str, subset_count: int) -> float:
+        """
+        Work out what fraction of features the spatially balanced sample can
+        keep within the memory budget. At least twenty candidates are kept
+        for each feature in the sample so it stays balanced.
+        """
+
+        feature_count = archelp.get_count(input_features)
+        needed = feature_count * self.spatial_bytes_per_feature
+
+        if not feature_count or self._fits_in_memory(needed):
+            return 1.0
+
+        available = self.memory.available() if self.memory else self.memory_budget
+        keep_rate = max(available / needed, min(1.0, 20 * subset_count / feature_count))
+        self._add_tool_message(
+            f"Input Features are estimated to need {needed / 2**20:,.0f} MB, more than the memory budget. "
+            f"Sampling from a random {keep_rate:.1%} of features instead.",
+            severity="WARNING"
+        )
+
+        return min(1.0, keep_rate)
+
     def execute(self, parameters: list[arcpy.Parameter], messages: list[Any]) -> None:
         """The source code of the tool."""
 
@@ -92,24 +536,36 @@ class SelectRandomFeatures_data(Tool):
         parameters = archelp.Parameters(parameters)
         input_features = parameters.input_features.valueAsText
         subset_count = int(parameters.subset_count.valueAsText)
+        weight_field = parameters.weight_field.valueAsText if parameters.sampling_method.valueAsText == "Weighted" else None
+        strata_field = parameters.strata_field.valueAsText
+        proportional = parameters.strata_allocation.valueAsText == "Proportional to stratum size"
+        rng = random.Random(parameters.seed.value)
         
         # Select subset from the input features
         #
-        # Credit for this portion of the tool can be found at:
+        # Credit for the original version of this portion of the tool can be found at:
         #   https://gis.stackexchange.com/questions/78251/how-to-randomly-subset-x-of-selected-points
         if subset_count != 0:
-            oids = [oid for oid, in arcpy.da.SearchCursor (input_features, "OID@")]
-            oidFldName = arcpy.Describe(input_features).OIDFieldName
-            path = arcpy.Describe(input_features).path
-            delimOidFld = arcpy.AddFieldDelimiters(path, oidFldName)
-            randOids = random.sample(oids, subset_count)
-            oidsStr = ", ".join(map(str, randOids))
-            sql = "{0} IN ({1})".format(delimOidFld, oidsStr)
-            selected_features = arcpy.SelectLayerByAttribute_management (input_features, "", sql)
-
-            # Update derived parameters and print message to geoprocessing window
-            parameters.selected_features.value = selected_features
-            count_selected_features = int(arcpy.management.GetCount(selected_features)[0])
+            if parameters.sampling_method.valueAsText == "Spatially Balanced":
+                keep_rate = self._spatial_keep_rate(input_features, subset_count)
+                randOids = self._sample_spatially_balanced(input_features, subset_count, rng, strata_field, proportional, keep_rate)
+            elif weight_field or strata_field:
+                randOids = self._sample_streaming(input_features, subset_count, rng, weight_field, strata_field, proportional)
+            else:
+                feature_properties = arcpy.Describe(input_features)
+                delimOidFld = arcpy.AddFieldDelimiters(feature_properties.path, feature_properties.OIDFieldName)
+                randOids = self._sample_oids(input_features, delimOidFld, subset_count, rng)
+
+            # An empty selection would select every feature, so leave the selection alone if nothing was sampled
+            if randOids:
+                selected_features = archelp.select_by_oids(parameters.input_features.value, randOids)
+
+                # Update derived parameters and print message to geoprocessing window
+                parameters.selected_features.value = selected_features
+                count_selected_features = len(set(randOids))
+            else:
+                self._add_tool_message("No features could be sampled from the input features. The selection was not changed.", severity="WARNING")
+                count_selected_features = 0
         else:
             count_selected_features = 0
             
@@ -118,4 +574,4 @@ class SelectRandomFeatures_data(Tool):
         # Print a random compliment to the geoprocessing pane if asked to
         self._get_complimented()
 
-        return
\ No newline at end of file
+        return
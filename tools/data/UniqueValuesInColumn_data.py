@@ -2,7 +2,8 @@ import arcpy
 import os
 import pandas as pd
 
-from typing import Any
+from typing import Any, Iterator
+from collections import Counter
 
 from utils.tool import Tool
 import utils.archelp as archelp
@@ -11,7 +12,6 @@ import utils.constants as constants
 ###
 #  TODO: 
 #   - Improve excel export formatting
-#   - Include progressor messages
 ###
 
 class UniqueValuesInColumn_data(Tool):
@@ -26,6 +26,7 @@ class UniqueValuesInColumn_data(Tool):
         self.alias = "UniqueValuesInColumn_data"
         self.description = "Finds unique values and counts of unique values in one or more columns."
         self.category = "General"
+        self.canRunInBackground = True
         
         return
     
@@ -120,21 +121,19 @@ class UniqueValuesInColumn_data(Tool):
 
         return
     
-    def _table_to_dataframe(self, table: str, column_names: pd.DataFrame, replace_domains: bool) -> pd.DataFrame:
+    def _parse_rows(self, table: str, column_names: list[str], replace_domains: bool) -> Iterator[tuple[str, ...]]:
         """
-        Convert table to pandas DataFrame and replace domain codes and
-        values as neccessary.
+        Read rows from a table as text, replacing domain codes and values as
+        neccessary.
         """
 
-        # Set up output and domain lookup table
-        parsed_rows = []
+        # Set up domain lookup table
         feature_info = arcpy.Describe(table)
-        domains = {d.name: d.codedValues for d in arcpy.da.ListDomains(feature_info.path) if d.domainType == "CodedValue"}
+        domains = archelp.get_domain_index(archelp.get_workspace(table)).coded_values
         lookup = {field.name: domains[field.domain] for field in feature_info.fields if field.name in column_names and field.domain in domains.keys()}
 
-        # Convert to dataframe
         with arcpy.da.SearchCursor(table, column_names) as cursor:
-            for row in cursor:
+            for row in archelp.progress(cursor, "Reading rows...", archelp.get_count(table)):
                 parsed_row = []
 
                 for index, column in enumerate(column_names):
@@ -154,10 +153,41 @@ class UniqueValuesInColumn_data(Tool):
 
                     parsed_row.append(col_value)
 
-                # Append to final output
-                parsed_rows.append(parsed_row)
+                yield tuple(parsed_row)
+
+    def _table_to_dataframe(self, table: str, column_names: list[str], replace_domains: bool) -> pd.DataFrame:
+        """
+        Convert table to pandas DataFrame and replace domain codes and
+        values as neccessary.
+        """
+        return pd.DataFrame(list(self._parse_rows(table, column_names, replace_domains)), columns=column_names)
+
+    def _count_rows(self, table: str, column_names: list[str], replace_domains: bool, groups: dict[str, list[str]], include_counts: bool) -> tuple[dict[str, pd.DataFrame], int]:
+        """
+        Count unique values for each group of columns while streaming rows,
+        without holding the whole table in memory. Memory use grows with the
+        number of unique values instead of the number of rows. Returns the
+        same dataframes as evaluating a dataframe of the whole table, and the
+        number of rows read.
+        """
+
+        positions = {group: [column_names.index(column) for column in columns] for group, columns in groups.items()}
+        counters = {group: Counter() for group in groups}
+        row_count = 0
+
+        for row in self._parse_rows(table, column_names, replace_domains):
+            row_count += 1
+            for group, indexes in positions.items():
+                counters[group][tuple(row[i] for i in indexes)] += 1
+
+        evaluated_dataframes = {}
 
-        return pd.DataFrame(parsed_rows, columns=column_names)
+        for group, columns in groups.items():
+            evaluated_dataframe = pd.DataFrame([(*key, count) for key, count in counters[group].items()], columns=[*columns, "Count"])
+            if not include_counts: evaluated_dataframe.drop(columns="Count", inplace=True)
+            evaluated_dataframes[group] = evaluated_dataframe
+
+        return evaluated_dataframes, row_count
 
     def _evaluate_dataframe(self, input_df: pd.DataFrame, include_counts: bool, columns: list[str] = None) -> pd.DataFrame:
         """
@@ -175,6 +205,29 @@ class UniqueValuesInColumn_data(Tool):
 
         return evaluated_dataframe
     
+    def _summarize_table(self, source: archelp.LayerSource, column_names: list[str], replace_domains: bool, groups: dict[str, list[str]], include_counts: bool) -> tuple[dict[str, pd.DataFrame], int]:
+        """
+        Find the unique values of each group of columns in a table. Also
+        returns the number of rows read.
+        """
+
+        with source.open() as table:
+            # Load the table to a pandas dataframe if it fits in the memory budget, otherwise count values as rows are read
+            # The rows are held twice while the dataframe is built
+            table_bytes = 2 * archelp.estimate_table_bytes(table, column_names)
+
+            if self._fits_in_memory(table_bytes):
+                with archelp.timed("read_table", columns=len(column_names)):
+                    input_df = self._table_to_dataframe(table, column_names, replace_domains)
+
+                with archelp.timed("evaluate_dataframe", rows=len(input_df.index)):
+                    return {group: self._evaluate_dataframe(input_df, include_counts, columns) for group, columns in groups.items()}, len(input_df.index)
+
+            self._add_tool_message(f"Input Features are estimated to need {table_bytes / 2**20:,.0f} MB, more than the memory budget. Counting values as rows are read instead.")
+
+            with archelp.timed("count_rows", columns=len(column_names)):
+                return self._count_rows(table, column_names, replace_domains, groups, include_counts)
+
     def _format_dataframe_text(self, input_df: pd.DataFrame) -> list[str]:
         """Format the console output of a dataframe left justified."""
 
@@ -205,17 +258,14 @@ class UniqueValuesInColumn_data(Tool):
         # Load parameters in a useful format
         parameters = archelp.Parameters(parameters)
 
-        # Load input features to a pandas dataframe
-        column_names = parameters.fields.valueAsText.split(";")
-        input_df = self._table_to_dataframe(parameters.input_features.valueAsText, column_names, parameters.use_domains.value)
-
         # Evaluate all columns together or individually as indicated
+        column_names = parameters.fields.valueAsText.split(";")
         include_counts = parameters.include_counts.value
+        groups = {column: [column] for column in column_names} if parameters.individual_eval.value else {"All Input Columns": column_names}
 
-        if parameters.individual_eval.value:
-            evaluated_dataframes = {column: self._evaluate_dataframe(input_df, include_counts, column) for column in column_names}    
-        else:
-            evaluated_dataframes = {"All Input Columns": self._evaluate_dataframe(input_df, include_counts, column_names)}
+        # Read and count the input features, in a worker process if out of process execution is turned on
+        source = archelp.LayerSource(parameters.input_features.valueAsText)
+        evaluated_dataframes, feature_rows = self._run_step(self._summarize_table, source, column_names, parameters.use_domains.value, groups, include_counts)
 
         # Print output to geoprocessing pane
         formatted_output = []
@@ -226,7 +276,7 @@ class UniqueValuesInColumn_data(Tool):
 
             formatted_output.append("\n".join([
                 f"## COLUMN: {column}",
-                f"{constants.TAB}Feature rows: {arcpy.GetCount_management(parameters.input_features.valueAsText)}",
+                f"{constants.TAB}Feature rows: {feature_rows}",
                 f"{constants.TAB}Unique combinations: {len(df.index)}",
                 "",
                 "".join(archelp.pretty_format(
@@ -243,7 +293,7 @@ class UniqueValuesInColumn_data(Tool):
         if parameters.output_as_excel.value:
             output_file = archelp.create_file(parameters.output_file.valueAsText)
 
-            with pd.ExcelWriter(output_file, mode="w", engine="openpyxl") as writer:
+            with archelp.timed("write_excel"), pd.ExcelWriter(output_file, mode="w", engine="openpyxl") as writer:
                 for sheet, df in evaluated_dataframes.items():
                     df.to_excel(writer, sheet, index=False)
 
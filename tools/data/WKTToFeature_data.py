@@ -0,0 +1,269 @@
+import arcpy
+import os
+import json
+import itertools
+import contextlib
+
+from typing import Any, Iterator
+from collections import deque
+
+import utils.archelp as archelp
+import utils.constants as constants
+from utils.tool import Tool
+
+###
+#  TODO:
+#   - Create attribute fields from GeoJSON properties
+###
+
+# Geometry type names reported by arcpy geometries for each feature class geometry type
+_GEOMETRY_TYPES: dict[str, str] = {"POINT": "point", "MULTIPOINT": "multipoint", "POLYLINE": "polyline", "POLYGON": "polygon"}
+
+def _parse_geometry(text: str, spatial_reference: arcpy.SpatialReference, srid_references: dict[int, arcpy.SpatialReference]) -> tuple[arcpy.Geometry, bool]:
+    """
+    Parse a WKT, EWKT, hex encoded WKB, or GeoJSON string into a geometry.
+    The format is detected from the text itself. EWKT in a different SRID
+    than the output spatial reference is projected into it. Also returns
+    whether the geometry was projected. Spatial references made for SRIDs
+    are kept in srid_references.
+    """
+
+    # GeoJSON can be a bare geometry or a feature with a geometry member
+    if text.startswith("{"):
+        geojson = json.loads(text)
+        return arcpy.AsShape(geojson.get("geometry", geojson) if geojson.get("type") == "Feature" else geojson), False
+
+    # Read the SRID from EWKT
+    srid = None
+    if text[:5].upper() == "SRID=":
+        prefix, text = text.split(";", 1)
+        # SRID 0 means the geometry has no spatial reference, so it is read in the output spatial reference
+        srid = int(prefix[5:]) or None
+
+    # Load geometries in their own SRID when it isn't the output spatial reference
+    project = srid is not None and srid != spatial_reference.factoryCode
+    if project and srid not in srid_references:
+        srid_references[srid] = arcpy.SpatialReference(srid)
+    input_reference = srid_references[srid] if project else spatial_reference
+
+    # Anything left that is entirely hex digits is WKB
+    if all(c in "0123456789abcdefABCDEF" for c in text[:32]):
+        geometry = arcpy.FromWKB(bytearray.fromhex(text), input_reference)
+    else:
+        geometry = arcpy.FromWKT(text, input_reference)
+
+    return (geometry.projectAs(spatial_reference) if project and geometry is not None else geometry), project
+
+def _error_text(error: Exception) -> str:
+    """Return the first line of an error message, or the error type if it has no message."""
+
+    return str(error).splitlines()[0] if str(error) else type(error).__name__
+
+def _parse_lines(lines: list[tuple[int, str]], spatial_reference: str, geometry_type: str) -> tuple[list[tuple[int, bytes]], list[tuple[int, str]], int]:
+    """
+    Worker process function that parses a batch of numbered lines. Returns
+    WKB for the lines that parsed to the expected geometry type, an error
+    message for the lines that didn't, and the number of geometries that
+    were projected from another SRID.
+    """
+
+    # Rebuild the spatial reference from its string form
+    sr = arcpy.SpatialReference()
+    sr.loadFromString(spatial_reference)
+
+    parsed, errors, projected_count, srid_references = [], [], 0, {}
+
+    for line_number, text in lines:
+        try:
+            geometry, projected = _parse_geometry(text, sr, srid_references)
+
+            if geometry is None or geometry.type != _GEOMETRY_TYPES[geometry_type]:
+                raise ValueError(f"expected {geometry_type.lower()} geometry, found {getattr(geometry, 'type', 'nothing')}")
+
+            parsed.append((line_number, bytes(geometry.WKB)))
+            projected_count += projected
+
+        # Any line can fail in its own way, so report every error and move on
+        except Exception as e:
+            errors.append((line_number, _error_text(e)))
+
+    return parsed, errors, projected_count
+
+class WKTToFeature_data(Tool):
+    def __init__(self) -> None:
+        """Creates features from a file of WKT, WKB, or GeoJSON geometries."""
+
+        # Initialize the parent class
+        super().__init__()
+
+        # Tool parameters
+        self.label = "WKT To Feature"
+        self.alias = "WKTToFeature_data"
+        self.description = "Creates features from a file of WKT, WKB, or GeoJSON geometries."
+        self.category = "Conversion"
+
+        # Number of lines parsed and inserted together, and the most bad lines listed in the output
+        self.batch_size = 10_000
+        self.max_reported_errors = 20
+
+        return
+
+    def getParameterInfo(self) -> list[arcpy.Parameter]:
+        """Define the tool parameters."""
+
+        input_file = arcpy.Parameter(
+            displayName = "Input File",
+            name = "input_file",
+            datatype = "DEFile",
+            parameterType = "Required",
+            direction = "Input"
+        )
+
+        output_features = arcpy.Parameter(
+            displayName = "Output Features",
+            name = "output_features",
+            datatype = "DEFeatureClass",
+            parameterType = "Required",
+            direction = "Output"
+        )
+
+        geometry_type = arcpy.Parameter(
+            displayName = "Geometry Type",
+            name = "geometry_type",
+            datatype = "GPString",
+            parameterType = "Required",
+            direction = "Input"
+        )
+        geometry_type.filter.type = "ValueList"
+        geometry_type.filter.list = list(_GEOMETRY_TYPES.keys())
+        geometry_type.value = "POLYGON"
+
+        spatial_reference = arcpy.Parameter(
+            displayName = "Spatial Reference",
+            name = "spatial_reference",
+            datatype = "GPSpatialReference",
+            parameterType = "Required",
+            direction = "Input"
+        )
+
+        parallel_processes = arcpy.Parameter(
+            displayName = "Parallel Processes",
+            name = "parallel_processes",
+            datatype = "GPLong",
+            parameterType = "Optional",
+            direction = "Input"
+        )
+        parallel_processes.filter.type = "Range"
+        parallel_processes.filter.list = [1, os.cpu_count() or 1]
+
+        return [input_file, output_features, geometry_type, spatial_reference, parallel_processes]
+
+    def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
+        """
+        Modify the values and properties of parameters before internal
+        validation is performed.
+        """
+
+        # Load parameters in a useful format
+        parameters = archelp.Parameters(parameters)
+
+        # Autogenerate output features in the default geodatabase if there is an input file
+        if parameters.input_file.altered and not parameters.output_features.altered:
+            file_name = os.path.basename(parameters.input_file.valueAsText).split(".")[0]
+            parameters.output_features.value = os.path.join(self.default_gdb, arcpy.ValidateTableName(f"{file_name}_WKTToFeature", self.default_gdb))
+
+        return
+
+    def _read_batches(self, path: str) -> Iterator[list[tuple[int, str]]]:
+        """Stream numbered, non-empty lines from a text or compressed file in batches."""
+
+        with archelp.open_text(path, "r") as infile:
+            lines = ((number, line.strip()) for number, line in enumerate(infile, start=1))
+            lines = ((number, line) for number, line in lines if line)
+
+            while batch := list(itertools.islice(lines, self.batch_size)):
+                yield batch
+
+    def _parse_batches(self, batches: Iterator[list[tuple[int, str]]], spatial_reference: str, geometry_type: str, workers: int) -> Iterator[tuple[list[tuple[int, bytes]], list[tuple[int, str]], int]]:
+        """
+        Parse batches of lines in order, with a pool of worker processes if
+        asked to. Only a few batches per worker are in flight at once, so the
+        input file is never read into memory all at once.
+        """
+
+        if not workers or workers <= 1:
+            for batch in batches:
+                yield _parse_lines(batch, spatial_reference, geometry_type)
+            return
+
+        with archelp.process_pool(workers) as pool:
+            pending = deque()
+
+            for batch in batches:
+                pending.append(pool.submit(_parse_lines, batch, spatial_reference, geometry_type))
+                if len(pending) >= workers * 2: yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def execute(self, parameters: list[arcpy.Parameter], messages: list[Any]) -> None:
+        """The source code of the tool."""
+
+        # Load parameters and define helpful variables
+        parameters = archelp.Parameters(parameters)
+        output_features = parameters.output_features.valueAsText
+        geometry_type = parameters.geometry_type.valueAsText
+        spatial_reference = parameters.spatial_reference.value
+
+        # Create the output feature class with a field that links each feature back to its line in the input file
+        # The field name fits in the 10 characters shapefiles allow
+        out_path, out_name = os.path.split(output_features)
+        arcpy.management.CreateFeatureclass(out_path, out_name, geometry_type, spatial_reference=spatial_reference)
+        arcpy.management.AddField(output_features, "SRC_LINE", "LONG")
+
+        # Geodatabases are edited inside an edit session, shapefiles can't be
+        workspace = archelp.get_workspace(output_features)
+        is_geodatabase = getattr(arcpy.Describe(workspace), "workspaceType", None) != "FileSystem"
+        edit_session = arcpy.da.Editor(workspace) if is_geodatabase else contextlib.nullcontext()
+
+        # Parse lines in batches and insert each batch of geometries through one cursor as it comes back
+        feature_count, error_count, projected_count, reported_errors = 0, 0, 0, []
+        batches = self._read_batches(parameters.input_file.valueAsText)
+
+        with edit_session, arcpy.da.InsertCursor(output_features, ["SHAPE@WKB", "SRC_LINE"]) as cursor:
+            for parsed, errors, projected in archelp.progress(self._parse_batches(batches, spatial_reference.exportToString(), geometry_type, parameters.parallel_processes.value), "Loading batches..."):
+                errors = list(errors)
+
+                # A geometry that parsed can still be rejected by the output, which is reported like a bad line
+                for line_number, wkb in parsed:
+                    try:
+                        cursor.insertRow([bytearray(wkb), line_number])
+                        feature_count += 1
+                    except Exception as e:
+                        errors.append((line_number, _error_text(e)))
+
+                error_count += len(errors)
+                projected_count += projected
+                reported_errors.extend(errors[:self.max_reported_errors - len(reported_errors)])
+
+        # Report bad lines without failing the tool
+        self._add_tool_message(f"Created {feature_count:,} features in {output_features}.")
+
+        if projected_count:
+            self._add_tool_message(
+                f"Projected {projected_count:,} EWKT geometries from an SRID other than the output spatial reference. "
+                "No geographic transformation was applied.",
+                severity="WARNING"
+            )
+        if error_count:
+            listed = "\n".join(f"{constants.TAB}Line {line_number}: {error}" for line_number, error in reported_errors)
+            self._add_tool_message(
+                f"Skipped {error_count:,} lines that could not be converted"
+                f"{f', the first {len(reported_errors)} are listed below' if error_count > len(reported_errors) else ''}:\n{listed}",
+                severity="WARNING"
+            )
+
+        # Print a random compliment to the geoprocessing pane if asked to
+        self._get_complimented()
+
+        return
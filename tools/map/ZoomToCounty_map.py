@@ -1,10 +1,9 @@
 import arcpy
-import requests
 
 from typing import Any
 
 import utils.archelp as archelp
-from utils.tool import Tool
+from utils.tool import Tool, validation_step
 
 ###
 #  TODO: 
@@ -50,7 +49,7 @@ class ZoomToCounty_map(Tool):
                 "returnDistinctValues": "true",
                 "f": "pjson"
             }
-            resp = requests.get(self.service_URL, query).json()
+            resp = archelp.rest_request(self.service_URL, query).json()
             state.filter.list = sorted([i['attributes']['STATE_NAME'] for i in resp['features']])
         # Catch the same errors here that we do in update messages 
         except:
@@ -67,6 +66,35 @@ class ZoomToCounty_map(Tool):
         
         return [state, county]
     
+    @validation_step("state")
+    def _county_names(self, state: str) -> list[str]:
+        """Get the sorted names of every county in a state from the service."""
+
+        query = {
+            "where": f"STATE_NAME = '{state}'",
+            "returnGeometry": "false",
+            "outFields": "NAME",
+            "f": "pjson"
+        }
+        resp = archelp.rest_request(self.service_URL, query).json()
+
+        return sorted([i['attributes']['NAME'] for i in resp['features']])
+
+    @validation_step(max_age=60)
+    def _check_service(self) -> None:
+        """Hit the service with a barebones query, raising an error if it can't be reached."""
+
+        query = {
+            "where": "1=1",
+            "returnGeometry": "false",
+            "outFields": "OBJECTID",
+            "resultRecordCount": "1",
+            "f": "pjson"
+        }
+        archelp.rest_request(self.service_URL, query).json()
+
+        return
+
     def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
         """ 
         Modify the values and properties of parameters before internal 
@@ -77,16 +105,9 @@ class ZoomToCounty_map(Tool):
         parameters = archelp.Parameters(parameters)
 
         # Update list of counties from service
-        if parameters.state.altered and not parameters.state.hasBeenValidated:
+        if parameters.any_changed("state"):
             try:
-                query = {
-                    "where": f"STATE_NAME = '{parameters.state.valueAsText}'",
-                    "returnGeometry": "false",
-                    "outFields": "NAME",
-                    "f": "pjson"
-                }
-                resp = requests.get(self.service_URL, query).json()
-                parameters.county.filter.list = sorted([i['attributes']['NAME'] for i in resp['features']])
+                parameters.county.filter.list = self._county_names(parameters)
                 parameters.county.value = None
             # Catch the same errors here that we do in update messages
             except:
@@ -104,17 +125,9 @@ class ZoomToCounty_map(Tool):
         parameters = archelp.Parameters(parameters)
 
         # See if we can hit the service with a barebones query
-        if ((parameters.state.altered and not parameters.state.hasBeenValidated)
-            or (parameters.county.altered and not parameters.county.hasBeenValidated)):
+        if parameters.any_changed("state", "county"):
             try:
-                query = {
-                    "where": "1=1",
-                    "returnGeometry": "false",
-                    "outFields": "OBJECTID",
-                    "resultRecordCount": "1",
-                    "f": "pjson"
-                }
-                resp = requests.get(self.service_URL, query).json()
+                self._check_service(parameters)
             # Need to be more specific here, not great to just have a blanket except
             # Need to do this here because internal validation overwrites errors set in updateParameters
             except:
@@ -139,7 +152,7 @@ class ZoomToCounty_map(Tool):
                 "outSR": f"{current_view.map.spatialReference.factoryCode}",
                 "f": "pjson"
             }
-            resp = requests.get(self.service_URL, query).json()
+            resp = archelp.rest_request(self.service_URL, query).json()
             ext_list = [resp['extent'][i] for i in ['xmin','ymin','xmax','ymax']]
 
             # Print some value messages to the geoprocessing window.
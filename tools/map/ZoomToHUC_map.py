@@ -1,11 +1,10 @@
 import arcpy
-import requests
 
 from typing import Any
 
 import utils.archelp as archelp
 import utils.constants as constants
-from utils.tool import Tool
+from utils.tool import Tool, validation_step
 
 ###
 #  TODO: 
@@ -68,6 +67,41 @@ class ZoomToHUC_map(Tool):
 
         return [state, huc_level, huc]
     
+    @validation_step("state", "huc_level")
+    def _huc_names(self, state: str, huc_level: str) -> list[str]:
+        """Get the sorted names of every HUC at a level in a state from the USGS REST service."""
+
+        layer = self.huc_layers[huc_level]
+        state = constants.STATE_ABBR(state)
+        huc_level = huc_level.lower()
+        base_url = f"{self.partial_service_URL}{layer}/query"
+        query = {
+            "where": f"states LIKE '%{state}%'",
+            "returnGeometry": "false",
+            "outFields": f"{huc_level},name",
+            "f": "pjson"
+        }
+        resp = archelp.rest_request(base_url, query).json()
+
+        return sorted([f"{i['attributes']['name']} [{i['attributes'][huc_level]}]" for i in resp['features']])
+
+    @validation_step("huc_level", max_age=60)
+    def _check_service(self, huc_level: str) -> None:
+        """Hit the service with a barebones query, raising an error if it can't be reached."""
+
+        layer = self.huc_layers[huc_level]
+        base_url = f"{self.partial_service_URL}{layer}/query"
+        query = {
+            "where": "1=1",
+            "returnGeometry": "false",
+            "outFields": "OBJECTID",
+            "resultRecordCount": "1",
+            "f": "pjson"
+        }
+        archelp.rest_request(base_url, query).json()
+
+        return
+
     def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
         """ 
         Modify the values and properties of parameters before internal 
@@ -78,25 +112,10 @@ class ZoomToHUC_map(Tool):
         parameters = archelp.Parameters(parameters)
 
         # Update watershed pick list
-        if ((parameters.state.altered and not parameters.state.hasBeenValidated)
-            or (parameters.huc_level.altered and not parameters.huc_level.hasBeenValidated)):
+        if parameters.any_changed("state", "huc_level"):
             try:
                 # Get all HUCs in current state from USGS REST 
-                layer = self.huc_layers[parameters.huc_level.valueAsText]
-                state = constants.STATE_ABBR(parameters.state.valueAsText)
-                huc_level = parameters.huc_level.valueAsText.lower()
-                base_url = f"{self.partial_service_URL}{layer}/query"
-                query = {
-                    "where": f"states LIKE '%{state}%'",
-                    "returnGeometry": "false",
-                    "outFields": f"{huc_level},name",
-                    "f": "pjson"
-                }
-                resp = requests.get(base_url, query).json()
-
-                # Parse response and set list for huc field
-                layer_list = [f"{i['attributes']['name']} [{i['attributes'][huc_level]}]" for i in resp['features']]
-                parameters.huc.filter.list = sorted(layer_list)
+                parameters.huc.filter.list = self._huc_names(parameters)
                 parameters.huc.value = None
             # Catch the same errors here that we do in update messages
             except:
@@ -115,19 +134,9 @@ class ZoomToHUC_map(Tool):
 
         # See if we can hit the service with a barebones query
         # Need to do this here because internal validation overwrites errors set in updateParameters
-        if ((parameters.state.altered and not parameters.state.hasBeenValidated)
-            or (parameters.huc_level.altered and not parameters.huc_level.hasBeenValidated)):
+        if parameters.any_changed("state", "huc_level"):
             try:
-                layer = self.huc_layers[parameters.huc_level.valueAsText]
-                base_url = f"{self.partial_service_URL}{layer}/query"
-                query = {
-                    "where": "1=1",
-                    "returnGeometry": "false",
-                    "outFields": "OBJECTID",
-                    "resultRecordCount": "1",
-                    "f": "pjson"
-                }
-                resp = requests.get(base_url, query).json()
+                self._check_service(parameters)
             # Need to be more specific here, not great to just have a blanket except
             except:
                 parameters.state.setErrorMessage("Unable to connect to service. This tool requires an internet connection.")
@@ -156,7 +165,7 @@ class ZoomToHUC_map(Tool):
                 "outSR": f"{current_view.map.spatialReference.factoryCode}",
                 "f": "pjson"
             }
-            resp = requests.get(base_url, query_params).json()
+            resp = archelp.rest_request(base_url, query_params).json()
             ext_list = [resp['extent'][i] for i in ['xmin','ymin','xmax','ymax']]
 
             # Print some value messages to the geoprocessing window.
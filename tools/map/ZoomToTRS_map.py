@@ -1,11 +1,10 @@
 import arcpy
-import requests
 
 from typing import Any
 
 import utils.archelp as archelp
 import utils.constants as constants
-from utils.tool import Tool
+from utils.tool import Tool, validation_step
 
 ###
 #  TODO: 
@@ -55,7 +54,7 @@ class ZoomToTRS_map(Tool):
                 "returnDistinctValues": "true",
                 "f": "pjson"
             }
-            resp = requests.get(self.township_service_url, query).json()
+            resp = archelp.rest_request(self.township_service_url, query).json()
             state.filter.list = [constants.STATE_NAME(i['attributes']['STATEABBR']) for i in resp['features'] if i['attributes']['STATEABBR']]
         # Catch the same errors here that we do in update messages 
         except:
@@ -89,55 +88,84 @@ class ZoomToTRS_map(Tool):
 
         return "".join([subs[c] if c in subs.keys() else c for c in text])
     
+    @validation_step("state")
+    def _township_names(self, state: str) -> list[str]:
+        """Get the sorted labels of every township in a state from the township service."""
+
+        query = {
+            "where": f"STATEABBR = '{constants.STATE_ABBR(state)}'",
+            "returnGeometry": "false",
+            "outFields": "TWNSHPLAB",
+            "orderByFields": "TWNSHPLAB",
+            "f": "pjson"
+        }
+        resp = archelp.arcgis_rest_query(self.township_service_url, query, 2000)
+
+        return sorted([self._multiple_replace(i['attributes']['TWNSHPLAB']) for i in resp['features']])
+
+    @validation_step("state", "township")
+    def _section_names(self, state: str, township: str) -> list[str]:
+        """Get the sorted labels of every section in a township from the section service."""
+
+        # Query township service to get township id
+        split_township = township.split()
+        query = {
+            "where": f"STATEABBR = '{constants.STATE_ABBR(state)}' AND TWNSHPLAB LIKE '%{split_township[0]}%{split_township[1]}'",
+            "returnGeometry": "false",
+            "outFields": "PLSSID",
+            "f": "pjson"
+        }
+        resp = archelp.rest_request(self.township_service_url, query).json()
+        plss_id = resp["features"][0]["attributes"]["PLSSID"]
+
+        # Query sections service to get list of sections that match township id
+        query = {
+            "where": f"PLSSID = '{plss_id}'",
+            "returnGeometry": "false",
+            "outFields": "FRSTDIVLAB",
+            "f": "pjson"
+        }
+        resp = archelp.rest_request(self.section_service_url, query).json()
+
+        return sorted([i["attributes"]["FRSTDIVLAB"] for i in resp["features"]])
+
+    @validation_step(max_age=60)
+    def _check_services(self) -> None:
+        """Hit the township and section services with barebones queries, raising an error if they can't be reached."""
+
+        query = {
+            "where": "1=1",
+            "returnGeometry": "false",
+            "outFields": "OBJECTID",
+            "resultRecordCount": "1",
+            "f": "pjson"
+        }
+        archelp.rest_request(self.township_service_url, query)
+        archelp.rest_request(self.section_service_url, query)
+
+        return
+
     def updateParameters(self, parameters: list[arcpy.Parameter]) -> None:
         """ 
         Modify the values and properties of parameters before internal 
         validation is performed.
         """
 
-        # Load parameters and set useful variables
+        # Load parameters in a useful format
         parameters = archelp.Parameters(parameters)
-        state_abbr = constants.STATE_ABBR(parameters.state.valueAsText)
 
         # Update township filter list
-        if parameters.state.altered and not parameters.state.hasBeenValidated:
+        if parameters.any_changed("state"):
             try:
-                query = {
-                    "where": f"STATEABBR = '{state_abbr}'",
-                    "returnGeometry": "false",
-                    "outFields": "TWNSHPLAB",
-                    "orderByFields": "TWNSHPLAB",
-                    "f": "pjson"
-                }
-                resp = archelp.arcgis_rest_query(self.township_service_url, query, 2000)
-                parameters.township.filter.list = sorted([self._multiple_replace(i['attributes']['TWNSHPLAB']) for i in resp['features']])
+                parameters.township.filter.list = self._township_names(parameters)
             # Catch the same errors here that we do in update messages 
             except:
                 pass
 
         # Update section filter list
-        if parameters.township.altered and not parameters.township.hasBeenValidated:
+        if parameters.any_changed("township"):
             try:
-                # Query township service to get township id
-                split_township = parameters.township.valueAsText.split()
-                query = {
-                    "where": f"STATEABBR = '{state_abbr}' AND TWNSHPLAB LIKE '%{split_township[0]}%{split_township[1]}'",
-                    "returnGeometry": "false",
-                    "outFields": "PLSSID",
-                    "f": "pjson"
-                }
-                resp = requests.get(self.township_service_url, query).json()
-                plss_id = resp["features"][0]["attributes"]["PLSSID"]
-
-                # Query sections service to get list of sections that match township id
-                query = {
-                    "where": f"PLSSID = '{plss_id}'",
-                    "returnGeometry": "false",
-                    "outFields": "FRSTDIVLAB",
-                    "f": "pjson"
-                }
-                resp = requests.get(self.section_service_url, query).json()
-                parameters.section.filter.list = sorted([i["attributes"]["FRSTDIVLAB"] for i in resp["features"]])
+                parameters.section.filter.list = self._section_names(parameters)
             # Catch the same errors here that we do in update messages 
             except:
                 pass
@@ -154,27 +182,9 @@ class ZoomToTRS_map(Tool):
         parameters = archelp.Parameters(parameters)
 
         # See if we can hit the township service with a barebones query
-        if ((parameters.state.altered and not parameters.state.hasBeenValidated)
-            or (parameters.township.altered and not parameters.township.hasBeenValidated)
-            or (parameters.section.altered and not parameters.section.hasBeenValidated)):
+        if parameters.any_changed("state", "township", "section"):
             try:
-                query = {
-                    "where": "1=1",
-                    "returnGeometry": "false",
-                    "outFields": "OBJECTID",
-                    "resultRecordCount": "1",
-                    "f": "pjson"
-                }
-                requests.get(self.township_service_url, query)
-
-                query = {
-                    "where": "1=1",
-                    "returnGeometry": "false",
-                    "outFields": "OBJECTID",
-                    "resultRecordCount": "1",
-                    "f": "pjson"
-                }
-                requests.get(self.section_service_url, query)
+                self._check_services(parameters)
             # Need to be more specific here, not great to just have a blanket except
             # Need to do this here because internal validation overwrites errors set in updateParameters
             except:
@@ -204,7 +214,7 @@ class ZoomToTRS_map(Tool):
                     "outSR": f"{current_view.map.spatialReference.factoryCode}",
                     "f": "pjson"
                 }
-                resp = requests.get(self.township_service_url, query).json()
+                resp = archelp.rest_request(self.township_service_url, query).json()
             else:
                 query = {
                     "where": f"STATEABBR = '{state_abbr}' AND TWNSHPLAB LIKE '%{split_township[0]}%{split_township[1]}'",
@@ -212,7 +222,7 @@ class ZoomToTRS_map(Tool):
                     "outFields": "PLSSID",
                     "f": "pjson"
                 }
-                resp = requests.get(self.township_service_url, query).json()
+                resp = archelp.rest_request(self.township_service_url, query).json()
                 plss_id = resp["features"][0]["attributes"]["PLSSID"]
 
                 query = {
@@ -221,7 +231,7 @@ class ZoomToTRS_map(Tool):
                     "outSR": f"{current_view.map.spatialReference.factoryCode}",
                     "f": "pjson"
                 }
-                resp = requests.get(self.section_service_url, query).json()
+                resp = archelp.rest_request(self.section_service_url, query).json()
 
             ext_list = [resp['extent'][i] for i in ['xmin','ymin','xmax','ymax']]
 
@@ -1,18 +1,35 @@
 import arcpy
+import io
 import os
+import sys
+import gzip
 import json
+import time
+import atexit
+import uuid
 import itertools
 import requests
+import contextlib
+import traceback
+import tracemalloc
+import multiprocessing
 
 from pathlib import Path
-from typing import Literal, Any, Generator, Iterator
+from typing import Literal, Any, Callable, Iterable, Iterator
 from enum import Enum
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 
 import utils.constants as constants
 
+# zstandard is not part of the stock ArcGIS Pro environment, so zstd compression is only available if it is installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 ###
 #  TODO: 
-#   - Improve toolbox config
 #   - Improve create file function
 #   - Maybe turn controlCLSID into a dataclass
 #       - Having issues with the enum
@@ -26,27 +43,144 @@ class ToolboxConfig():
     """
     Loads a toolbox config file and creates an objeect for accessing the
     config values. Input is the full path to the config file.
+
+    There is one config object per config file for the whole session. The
+    file is only parsed again when its modified time changes, and values
+    are converted to the type of their parameter when the file is parsed.
+    Changes are written to a temporary file that replaces the config file,
+    so other ArcGIS Pro sessions never read a half written config.
     """
 
+    # Python types for each config parameter type, values of other types are left as they are
+    VALUE_TYPES = {"GPString": str, "GPBoolean": bool, "GPLong": int, "GPDouble": float}
+
+    # Config objects shared by the session, keyed by the full path to the config file
+    _instances: dict[str, "ToolboxConfig"] = {}
+
+    def __new__(cls, config_path: os.PathLike) -> "ToolboxConfig":
+        key = os.path.normcase(os.path.abspath(config_path))
+
+        if key not in cls._instances:
+            instance = super().__new__(cls)
+            instance.config_path = config_path
+            instance.config_values = None
+            instance._values = {}
+            instance._modified = None
+            cls._instances[key] = instance
+
+        return cls._instances[key]
+
     def __init__(self, config_path: os.PathLike) -> None:
-        self.config_path = config_path
-        self.config_values = self._load_config(config_path)
         return
-    
+
     def _load_config(self, path) -> dict:
         """ Attempt to decode json file. """
         try:
-            return json.load(open(path))
+            with open(path, encoding="utf-8") as config_file:
+                return json.load(config_file)
         except FileNotFoundError:
             return None
-    
-    def value(self, index: str) -> str:
+
+    def _typed_value(self, entry: dict[str, Any]) -> Any:
+        """ Convert a config value to the type of its parameter. """
+        value, value_type = entry.get("value"), self.VALUE_TYPES.get(entry.get("type"))
+        if value is None or value_type is None:
+            return value
+        try:
+            return value_type(value)
+        except (TypeError, ValueError):
+            return value
+
+    def _refresh(self) -> None:
+        """ Parse the config file again if it changed since it was last parsed. """
+        try:
+            modified = os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            modified = None
+
+        if modified == self._modified:
+            return
+
+        # Keep the last good values if the file can't be decoded
+        try:
+            config_values = self._load_config(self.config_path)
+        except (OSError, ValueError):
+            return
+
+        self.config_values = config_values
+        self._values = {index: self._typed_value(entry) for index, entry in (config_values or {}).items()}
+        self._modified = modified
+
+        return
+
+    def value(self, index: str) -> Any:
         """ Return the config value at the given index. """        
-        if(self.config_values and index in self.config_values.keys()):
-            return self.config_values[index]["value"]
-        return None
-    
+        self._refresh()
+        return self._values.get(index)
+
+    def values(self) -> dict[str, Any]:
+        """ Return a copy of every config value. """
+        self._refresh()
+        return dict(self._values)
+
     def asParameters(self) -> list[arcpy.Parameter]:
+        """ 
+        Create a parameter for each config value with the current value as
+        its default. New parameters are created each time because ArcGIS Pro
+        changes the parameters it is given.
+        """
+        self._refresh()
+        parameters = []
+
+        for index, entry in (self.config_values or {}).items():
+            parameter = arcpy.Parameter(
+                displayName = entry.get("alias") or index,
+                name = index,
+                datatype = entry.get("type") or "GPString",
+                parameterType = "Required",
+                direction = "Input",
+                category = entry.get("category")
+            )
+
+            if entry.get("list"):
+                parameter.filter.type = "ValueList"
+                parameter.filter.list = entry["list"]
+
+            parameter.value = self._values.get(index)
+            parameters.append(parameter)
+
+        return parameters
+
+    def update(self, values: dict[str, Any]) -> None:
+        """ 
+        Set config values and write them to the config file. The newest
+        version of the file is read first so changes made by other sessions
+        aren't lost, then a temporary file replaces the config file in one
+        step.
+        """
+        config_values = self._load_config(self.config_path) or {}
+
+        for index, value in values.items():
+            if index in config_values:
+                config_values[index]["value"] = value
+
+        folder = os.path.dirname(os.path.abspath(self.config_path))
+        temp_path = os.path.join(folder, f".{os.path.basename(self.config_path)}.{os.getpid()}.tmp")
+
+        try:
+            with open(temp_path, "w", encoding="utf-8") as temp_file:
+                json.dump(config_values, temp_file, indent=4)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, self.config_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        # Parse again even if the modified time didn't change enough to notice
+        self._modified = None
+        self._refresh()
+
         return
     
 def toolbox_abspath(path: os.PathLike) -> os.PathLike:
@@ -90,47 +224,115 @@ class Parameters(list):
     parameters list is rebuilt each time it is passed between tool
     functions. That list can be immediately converted to a Parameters object
     at the beginning of the function.
+
+    The parameters are kept in the list itself alongside an index of their
+    positions by name, so every lookup is O(1). Every method that changes
+    the list rebuilds the index, and copies and pickles rebuild it from the
+    copied parameters. Parameters changed by the
+    user since the last validation pass are available through changed and
+    any_changed.
     """
 
+    __slots__ = ("_index",)
+
     def __init__(self, parameters: list[arcpy.Parameter]) -> None:
-        self.__dict__.update({parameter.name: parameter for parameter in parameters})
-        return
-    
-    def __iter__(self) -> Generator[arcpy.Parameter, None, None]:
-        for value in self.__dict__.values():
-            yield value
+        super().__init__(parameters)
+        self._reindex()
         return
-    
-    def __len__(self) -> int:
-        return len(self.__dict__)
+
+    def _reindex(self) -> None:
+        """ Rebuild the positions of the parameters by name. """
+        self._index = {parameter.name: position for position, parameter in enumerate(self)}
     
     def __getitem__(self, key) -> arcpy.Parameter:
-        if isinstance(key, int):
-            return list(self)[key]
-        return self.__dict__[key]
+        if isinstance(key, str):
+            return super().__getitem__(self._index[key])
+        return super().__getitem__(key)
     
     def __setitem__(self, key, value) -> None:
-        if isinstance(key, int):
-            self.__dict__[list(self.__dict__)[key]] = value
-        self.__dict__[key] = value
+        if isinstance(key, str):
+            if key not in self._index:
+                self.append(value)
+                return
+            key = self._index[key]
+        super().__setitem__(key, value)
+        self._reindex()
         return
+
+    def __reduce__(self) -> tuple[type, tuple[list[arcpy.Parameter]]]:
+        # Copies and pickles are rebuilt from the parameters so the index is rebuilt with them
+        return type(self), (list(self),)
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(self._index[key] if isinstance(key, str) else key)
+        self._reindex()
+        return
+
+    def __iadd__(self, parameters: list[arcpy.Parameter]) -> "Parameters":
+        self.extend(parameters)
+        return self
     
     def __getattr__(self, name: str) -> arcpy.Parameter:
-        if name in self.__dict__:
-            return self.__dict__[name]
-        return super().__getattribute__(name)
+        index = object.__getattribute__(self, "_index")
+        if name in index:
+            return super().__getitem__(index[name])
+        raise AttributeError(f"{type(self).__name__} has no parameter named '{name}'")
+    
+    def __contains__(self, key) -> bool:
+        if isinstance(key, str):
+            return key in self._index
+        return super().__contains__(key)
     
     def append(self, parameter: arcpy.Parameter) -> None:
         if not isinstance(parameter, arcpy.Parameter):
             raise TypeError(f"Parameter must be of type arcpy.Parameter, not {type(parameter)}")
-        self.__dict__[parameter.name] = parameter
+        if parameter.name in self._index:
+            super().__setitem__(self._index[parameter.name], parameter)
+        else:
+            self._index[parameter.name] = len(self)
+            super().append(parameter)
     
     def extend(self, parameters: list[arcpy.Parameter]) -> None:
         for parameter in parameters:
             self.append(parameter)
+
+    def insert(self, position: int, parameter: arcpy.Parameter) -> None:
+        super().insert(position, parameter)
+        self._reindex()
+
+    def pop(self, position: int = -1) -> arcpy.Parameter:
+        parameter = super().pop(position)
+        self._reindex()
+        return parameter
+
+    def remove(self, parameter: arcpy.Parameter) -> None:
+        super().remove(parameter)
+        self._reindex()
+
+    def clear(self) -> None:
+        super().clear()
+        self._reindex()
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self._reindex()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._reindex()
+
+    @property
+    def changed(self) -> frozenset[str]:
+        """ Names of parameters that changed since the last validation pass. """
+        return frozenset(parameter.name for parameter in self if parameter.altered and not parameter.hasBeenValidated)
     
-    def __repr__(self) -> str:
-        return str(list(self.__dict__.values()))
+    def any_changed(self, *names: str) -> bool:
+        """ Check if any of the named parameters changed since the last validation pass. """
+        for name in names:
+            parameter = self[name]
+            if parameter.altered and not parameter.hasBeenValidated:
+                return True
+        return False
     
 def load_fieldmap(path: os.PathLike) -> arcpy.FieldMappings:
     """Create a Field Mappings object from a .fieldmap file."""
@@ -138,6 +340,236 @@ def load_fieldmap(path: os.PathLike) -> arcpy.FieldMappings:
     with open(path, 'r') as fieldmap:
         return arcpy.FieldMappings().loadFromString(fieldmap.read())
     
+def get_workspace(dataset: Any) -> str:
+    """
+    Return the path to the workspace that contains a dataset, stepping out
+    of feature datasets as needed.
+    """
+
+    workspace = arcpy.Describe(dataset).path
+
+    # Walk up the path until a workspace or folder is found
+    while arcpy.Describe(workspace).dataType not in ("Workspace", "Folder"):
+        parent = os.path.dirname(workspace)
+        if parent == workspace: break
+        workspace = parent
+
+    return workspace
+
+def oid_ranges(oids: list[int]) -> Iterator[tuple[int, int]]:
+    """Compress a collection of OIDs into sorted, inclusive (start, end) ranges."""
+
+    sorted_oids = sorted(set(oids))
+    if not sorted_oids: return
+
+    # Extend the current range until there is a gap
+    start = end = sorted_oids[0]
+
+    for oid in sorted_oids[1:]:
+        if oid == end + 1:
+            end = oid
+        else:
+            yield start, end
+            start = end = oid
+
+    yield start, end
+
+def oid_where_clauses(oids: list[int], oid_field: str, max_terms: int = 1000) -> Iterator[str]:
+    """
+    Build where clauses that together match every OID. Runs of three or more
+    consecutive OIDs become BETWEEN predicates and the rest are grouped into
+    IN lists. No clause holds more than max_terms predicates or IN values.
+    """
+
+    terms = 0
+    betweens, singles = [], []
+
+    def clause() -> str:
+        predicates = [f"{oid_field} BETWEEN {start} AND {end}" for start, end in betweens]
+        if singles: predicates.append(f"{oid_field} IN ({', '.join(map(str, singles))})")
+        return " OR ".join(predicates)
+
+    # Split each range into terms and start a new clause before a term would go over the limit
+    for start, end in oid_ranges(oids):
+        run = [(start, end)] if end - start >= 2 else list(range(start, end + 1))
+
+        for term in run:
+            if terms >= max_terms:
+                yield clause()
+                terms = 0
+                betweens, singles = [], []
+
+            (betweens if isinstance(term, tuple) else singles).append(term)
+            terms += 1
+
+    if betweens or singles:
+        yield clause()
+
+def max_where_terms(workspace: str) -> int:
+    """Return the largest number of predicates or IN values to put in one where clause for a workspace."""
+
+    # Enterprise databases like Oracle cap IN lists at 1000 values, local workspaces can take larger clauses
+    return 1000 if getattr(arcpy.Describe(workspace), "workspaceType", None) == "RemoteDatabase" else 10000
+
+def select_by_oids(layer: Any, oids: list[int], selection_set_threshold: int = 1000) -> Any:
+    """
+    Replace the selection on a layer with the given OIDs and return the layer.
+
+    Large selections on map layers set the selection set directly. Everything
+    else is selected with compact where clauses, split into batches sized for
+    the workspace type and added to the selection one batch at a time.
+    """
+
+    # Setting the selection set directly skips SQL entirely
+    if hasattr(layer, "setSelectionSet") and len(oids) >= selection_set_threshold:
+        with timed("set_selection_set", count=len(oids)):
+            layer.setSelectionSet(list(oids), "NEW")
+        return layer
+
+    workspace = get_workspace(layer)
+    max_terms = max_where_terms(workspace)
+    oid_field = arcpy.AddFieldDelimiters(workspace, arcpy.Describe(layer).OIDFieldName)
+
+    # Start a new selection with the first batch then add the rest
+    selection_type = "NEW_SELECTION"
+    result = layer
+
+    for where_clause in oid_where_clauses(oids, oid_field, max_terms):
+        with timed("select_by_attribute"):
+            result = arcpy.management.SelectLayerByAttribute(layer, selection_type, where_clause)[0]
+        selection_type = "ADD_TO_SELECTION"
+
+    # Clear the selection if there were no OIDs
+    if selection_type == "NEW_SELECTION":
+        result = arcpy.management.SelectLayerByAttribute(layer, "CLEAR_SELECTION")[0]
+
+    return result
+    
+# Row counts shared by every tool in the session, keyed by data source and definition query
+_count_cache: OrderedDict[tuple[str, str], int] = OrderedDict()
+
+def get_count(dataset: Any, refresh: bool = False, max_entries: int = 256) -> int:
+    """
+    Return the number of rows in a layer, table view, or dataset.
+
+    Layers with a selection are counted from the selection set, which needs
+    no query. Other counts are cached by data source and definition query,
+    so changing either one is a cache miss. Set refresh to force a new
+    count, for example when the underlying data may have been edited.
+    """
+
+    # Count the selection set directly if there is one
+    properties = arcpy.Describe(dataset)
+    fid_set = getattr(properties, "FIDSet", None)
+
+    if fid_set:
+        return len(fid_set.split(";"))
+
+    # Otherwise look up or refresh the cached count
+    key = (getattr(properties, "catalogPath", str(dataset)), getattr(properties, "whereClause", None) or "")
+
+    if refresh or key not in _count_cache:
+        with timed("get_count", dataset=key[0]):
+            _count_cache[key] = int(arcpy.management.GetCount(dataset)[0])
+
+    # Keep the most recently used counts and drop the oldest
+    _count_cache.move_to_end(key)
+    while len(_count_cache) > max_entries: _count_cache.popitem(last=False)
+
+    return _count_cache[key]
+
+def clear_count_cache() -> None:
+    """Forget all cached row counts."""
+
+    _count_cache.clear()
+    return
+
+class DomainIndex():
+    """
+    Domains in a workspace, indexed by name. Coded value domains also have
+    a code to description lookup ready to use.
+    """
+
+    def __init__(self, workspace: str) -> None:
+        self.workspace = workspace
+        with timed("list_domains", workspace=workspace):
+            self.domains = {domain.name: domain for domain in arcpy.da.ListDomains(workspace)}
+        self.coded_values = {name: domain.codedValues for name, domain in self.domains.items() if domain.domainType == "CodedValue"}
+        return
+
+# Domain indexes shared by every tool in the session, keyed by workspace
+_domain_cache: dict[str, tuple[float, float, DomainIndex]] = {}
+
+def _workspace_modified(workspace: str) -> float:
+    """
+    Return the latest modification time of the files in a local workspace,
+    or None for workspaces like enterprise geodatabases that can't be checked
+    this way.
+    """
+
+    if not os.path.isdir(workspace):
+        return None
+
+    return max((entry.stat().st_mtime for entry in os.scandir(workspace) if entry.is_file()), default=os.path.getmtime(workspace))
+
+def get_domain_index(workspace: str, refresh: bool = False, max_age: float = 300) -> DomainIndex:
+    """
+    Return the domain index for a workspace, listing domains only when
+    needed. Indexes for local workspaces are reused until a file in the
+    workspace changes. Indexes for other workspaces are reused for max_age
+    seconds. Set refresh to force the domains to be listed again.
+    """
+
+    modified = _workspace_modified(workspace)
+    cached = _domain_cache.get(workspace)
+
+    # Reuse the cached index if the workspace hasn't changed since it was built
+    if not refresh and cached:
+        cached_modified, loaded, index = cached
+        if cached_modified == modified and (modified is not None or time.monotonic() - loaded < max_age):
+            return index
+
+    index = DomainIndex(workspace)
+    _domain_cache[workspace] = (modified, time.monotonic(), index)
+
+    return index
+
+def clear_domain_cache() -> None:
+    """Forget all cached domain indexes."""
+
+    _domain_cache.clear()
+    return
+
+def process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Create a pool of worker processes that also works from inside ArcGIS Pro.
+
+    Pro can't be used to start worker processes, so multiprocessing is
+    pointed at the Python interpreter of the active environment instead.
+    Work submitted to the pool must be a module level function so it can be
+    imported by the workers.
+    """
+
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=worker_context())
+
+def worker_context() -> multiprocessing.context.SpawnContext:
+    """
+    Return a multiprocessing context for starting worker processes, pointed
+    at the Python interpreter of the active environment when running inside
+    ArcGIS Pro.
+    """
+
+    if not os.path.basename(sys.executable).lower().startswith("python"):
+        multiprocessing.set_executable(os.path.join(sys.exec_prefix, "pythonw.exe"))
+
+    return multiprocessing.get_context("spawn")
+
+def rest_request(url: str, query: dict[str, Any]) -> requests.Response:
+    """Send a GET request to a REST service, timed when instrumentation is turned on."""
+
+    with timed("rest_request", url=url):
+        return requests.get(url, query)
+
 def arcgis_rest_query(url: str, query: dict[str, Any], max_records: int) -> dict[str, Any]:
     """
     Query ArcGIS REST service and return all records, regardless of
@@ -151,7 +583,7 @@ def arcgis_rest_query(url: str, query: dict[str, Any], max_records: int) -> dict
     # Loop until all records are collected
     while True:
         # Get result of query and store the whole things or portions of it as needed
-        cur_resp = requests.get(url, query).json()
+        cur_resp = rest_request(url, query).json()
 
         if not resp:
             resp = cur_resp
@@ -187,6 +619,43 @@ def create_file(complete_path: str) -> str:
 
     return os.path.join(head, tail)
 
+# File extensions for each supported compression type
+COMPRESSION_EXTENSIONS: dict[str, str] = {"gzip": ".gz", "zstd": ".zst"}
+
+def available_compressions() -> list[str]:
+    """Return the compression types that can be used in this environment."""
+
+    return ["gzip"] + (["zstd"] if zstandard else [])
+
+def open_text(path: str, mode: Literal["r", "w"] = "r", compression: str = "infer", buffering: int = 1 << 20) -> io.TextIOBase:
+    """
+    Open a UTF-8 text file for streaming reads or writes, compressing or
+    decompressing on the fly. Compression can be None, "gzip", "zstd", or
+    "infer" to pick it from the file extension.
+    """
+
+    # Work out compression from the file extension if needed
+    if compression == "infer":
+        compression = next((c for c, ext in COMPRESSION_EXTENSIONS.items() if str(path).lower().endswith(ext)), None)
+
+    match compression:
+        case "gzip":
+            return gzip.open(path, f"{mode}t", encoding="utf-8", compresslevel=6)
+        case "zstd":
+            if zstandard is None:
+                raise ImportError("zstd compression requires the zstandard package.")
+            raw = open(path, f"{mode}b")
+
+            # Close the file if the stream can't be set up, so it isn't left locked
+            try:
+                stream = zstandard.ZstdCompressor().stream_writer(raw) if mode == "w" else zstandard.ZstdDecompressor().stream_reader(raw)
+                return io.TextIOWrapper(io.BufferedWriter(stream, buffering) if mode == "w" else io.BufferedReader(stream, buffering), encoding="utf-8")
+            except BaseException:
+                raw.close()
+                raise
+        case _:
+            return open(path, mode, buffering=buffering, encoding="utf-8")
+
 def delete_scratch_names(scratch_names: list[Any]) -> list[Any]:
     """
     Attempt to delete scratch names. Return any names that could not
@@ -196,10 +665,712 @@ def delete_scratch_names(scratch_names: list[Any]) -> list[Any]:
     # Attempt to delete names
     return [name for name in scratch_names if not arcpy.Exists(name) or not arcpy.Delete_management(name)]
 
+class ScratchWorkspace():
+    """
+    Hands out names for intermediate datasets and deletes every one of them
+    when the block it is used in exits, even if an exception was raised.
+
+    Datasets go in the memory workspace while their estimated size fits in
+    the memory budget, and in the scratch geodatabase otherwise. Set shared
+    for datasets other processes have to read, because the memory workspace
+    only exists in the process that created it. Projected copies of the same
+    input in the same spatial reference are only made once.
+    """
+
+    def __init__(self, memory_budget: int) -> None:
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.names = []
+        self._projected = {}
+        return
+
+    def __enter__(self) -> "ScratchWorkspace":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+        return
+
+    def name(self, prefix: str = "scratch", estimated_bytes: int = 0, data_type: str = "FeatureClass", shared: bool = False) -> str:
+        """Return a unique name for an intermediate dataset and delete it on exit."""
+
+        # Keep the dataset in memory if it fits in what is left of the budget
+        if not shared and self.memory_used + estimated_bytes <= self.memory_budget:
+            self.memory_used += estimated_bytes
+            name = f"memory\\{prefix}_{uuid.uuid4().hex[:8]}"
+        else:
+            name = arcpy.CreateScratchName(prefix, "", data_type, arcpy.env.scratchGDB)
+
+        self.names.append(name)
+
+        return name
+
+    def projected(self, features: Any, spatial_reference: arcpy.SpatialReference, transformation: str = None, shared: bool = False) -> str:
+        """
+        Return a copy of features projected into a spatial reference. The copy
+        respects the selection and definition query of a layer, and is reused
+        if the same features are projected the same way again.
+        """
+
+        properties = arcpy.Describe(features)
+        key = (
+            getattr(properties, "catalogPath", str(features)), getattr(properties, "whereClause", None) or "",
+            getattr(properties, "FIDSet", None) or "", spatial_reference.exportToString(), transformation or "", shared
+        )
+
+        if key not in self._projected:
+            # Shared copies never go in the memory workspace, so they don't need a size estimate
+            estimated_bytes = 0 if shared else estimate_table_bytes(features, [field.name for field in arcpy.ListFields(features)])
+            output = self.name("projected", estimated_bytes, shared=shared)
+
+            with timed("project", dataset=key[0]):
+                arcpy.management.Project(features, output, spatial_reference, transformation)
+
+            self._projected[key] = output
+
+        return self._projected[key]
+
+    def cleanup(self) -> list[str]:
+        """
+        Delete every intermediate dataset. Return any names that could not be
+        deleted.
+        """
+
+        remaining = []
+
+        # Deleting can fail on a locked dataset, but every other name should still be tried
+        # Names are handed out before their dataset is made, so some may never have been created
+        for name in self.names:
+            try:
+                if arcpy.Exists(name): remaining.extend(delete_scratch_names([name]))
+            except Exception:
+                remaining.append(name)
+
+        self.names, self._projected, self.memory_used = remaining, {}, 0
+
+        return remaining
+
+#################################################
+# INSTRUMENTATION
+#################################################
+
+class TimingLog():
+    """
+    Collects timings for a tool and writes them to a JSON lines file. Each
+    line is one timed phase with the tool, phase name, duration in seconds,
+    and nesting depth. Timings are kept in memory until the log is written,
+    so timing a tool only appends to the file once per tool phase.
+    """
+
+    def __init__(self, path: str, tool: str) -> None:
+        self.path = path
+        self.tool = tool
+        self.depth = 0
+        self.events = []
+        return
+
+    def merge(self, events: list[dict[str, Any]]) -> None:
+        """Add timings recorded by a worker process, nested under the phase currently being timed."""
+
+        for event in events:
+            self.events.append({**event, "tool": self.tool, "depth": event["depth"] + self.depth})
+
+        return
+
+    def record(self, phase: str, started: float, seconds: float, **details: Any) -> None:
+        """Add a timed phase to the log."""
+
+        self.events.append({
+            "timestamp": started, "tool": self.tool, "phase": phase,
+            "seconds": round(seconds, 6), "depth": self.depth, "pid": os.getpid(), **details
+        })
+
+        return
+
+    def write(self) -> None:
+        """Append the collected timings to the log file."""
+
+        if not self.events or self.path is None: return
+
+        # Timings are nice to have, a tool shouldn't fail because they can't be written
+        try:
+            with open(self.path, "a", encoding="utf-8") as log_file:
+                log_file.write("".join(f"{json.dumps(event, default=str)}\n" for event in self.events))
+        except OSError:
+            pass
+
+        self.events = []
+
+        return
+
+# Active timing logs, the most recent one records timings made with timed
+_timing_logs: list[TimingLog] = []
+
+@contextlib.contextmanager
+def timing_session(path: str, tool: str) -> Iterator[TimingLog]:
+    """
+    Record timings made with timed to a JSON lines file until the block ends.
+    Without an active session, timed does nothing.
+    """
+
+    log = TimingLog(path, tool)
+    _timing_logs.append(log)
+
+    try:
+        yield log
+    finally:
+        _timing_logs.remove(log)
+        log.write()
+
+@contextlib.contextmanager
+def timed(phase: str, **details: Any) -> Iterator[None]:
+    """
+    Time a block of code and record it in the active timing session, along
+    with any details given as keyword arguments.
+    """
+
+    if not _timing_logs:
+        yield
+        return
+
+    log = _timing_logs[-1]
+    started, start = time.time(), time.perf_counter()
+    log.depth += 1
+
+    try:
+        yield
+    finally:
+        log.depth -= 1
+        log.record(phase, started, time.perf_counter() - start, **details)
+
+def timed_rows(rows: Iterable[Any], phase: str, **details: Any) -> Iterator[Any]:
+    """
+    Yield rows from a cursor and record the time spent reading them, along
+    with the number of rows, in the active timing session. Time spent by the
+    loop on each row isn't counted, so the timing is only the data access.
+    """
+
+    if not _timing_logs:
+        yield from rows
+        return
+
+    log = _timing_logs[-1]
+    started, seconds, count = time.time(), 0.0, 0
+    iterator = iter(rows)
+
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                row = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                seconds += time.perf_counter() - start
+
+            count += 1
+            yield row
+    finally:
+        log.record(phase, started, seconds, rows=count, **details)
+
+def read_timings(path: str) -> Iterator[dict[str, Any]]:
+    """Read timings from a JSON lines timing log, skipping lines that can't be decoded."""
+
+    with open(path, encoding="utf-8") as log_file:
+        for line in log_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """Nearest rank percentile of a sorted list of values."""
+
+    if not sorted_values: return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+
+    return sorted_values[int(rank) - 1]
+
+# Rough bytes used in memory by one python value of each field type, including the pointer to it
+FIELD_VALUE_BYTES = {
+    "SmallInteger": 36, "Integer": 36, "BigInteger": 40, "Single": 32, "Double": 32,
+    "Date": 56, "DateOnly": 40, "TimeOnly": 40, "TimestampOffset": 64,
+    "OID": 36, "GlobalID": 95, "Guid": 95, "Geometry": 400, "Blob": 1000, "Raster": 1000
+}
+
+def current_rss(peak: bool = False) -> int | None:
+    """
+    Return the resident memory of this process in bytes, or None if it can't
+    be read. Set peak to get the most the process has ever used instead.
+    """
+
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            import ctypes.wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", ctypes.wintypes.DWORD), ("PageFaultCount", ctypes.wintypes.DWORD)] \
+                    + [(name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                                                           "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+            return counters.PeakWorkingSetSize if peak else counters.WorkingSetSize
+
+        if peak:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    except (OSError, AttributeError, ValueError, ImportError):
+        return None
+
+def estimate_table_bytes(dataset: Any, fields: list[str], rows: int = None) -> int:
+    """
+    Estimate the memory needed to hold the given fields of every row of a
+    dataset as python values. Text fields are sized by their field length.
+    """
+
+    rows = get_count(dataset) if rows is None else rows
+    field_types = {f.name: f for f in arcpy.ListFields(dataset)}
+    row_bytes = 56 + 8 * len(fields)
+
+    for name in fields:
+        field = field_types.get(name)
+        if field is None or field.type == "String":
+            row_bytes += 57 + (field.length if field else 32)
+        else:
+            row_bytes += FIELD_VALUE_BYTES.get(field.type, 64)
+
+    return rows * row_bytes
+
+class MemoryProbe():
+    """
+    Tracks memory used while a block of code runs, against a budget in
+    bytes. Memory is measured from the resident size of the process, or with
+    tracemalloc if trace is set. Tracing finds the true peak of python
+    allocations but slows python code down, so it is off by default.
+    """
+
+    def __init__(self, budget: int, trace: bool = False) -> None:
+        self.budget = budget
+        self.trace = trace
+        self.rss_start = None
+        self.rss_end = None
+        self.peak_start = None
+        self.peak_end = None
+        self.traced_peak = None
+        self.worker_peak = None
+        self._started_tracing = False
+        return
+
+    def add_worker_peak(self, peak: int | None) -> None:
+        """Record the peak resident memory of a worker process that ran part of the work."""
+
+        if peak is not None:
+            self.worker_peak = max(self.worker_peak or 0, peak)
+
+        return
+
+    def __enter__(self) -> "MemoryProbe":
+        self.rss_start = current_rss()
+        self.peak_start = current_rss(peak=True)
+
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.rss_end = current_rss()
+        self.peak_end = current_rss(peak=True)
+
+        if self.trace and tracemalloc.is_tracing():
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            if self._started_tracing: tracemalloc.stop()
+
+        return
+
+    def used(self) -> int:
+        """Memory used since the probe started, in bytes."""
+
+        if self.trace and tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[0]
+
+        rss = current_rss()
+        return max(0, rss - self.rss_start) if rss is not None and self.rss_start is not None else 0
+
+    def available(self) -> int:
+        """Bytes left in the budget."""
+        return max(0, self.budget - self.used())
+
+    def fits(self, estimate: int) -> bool:
+        """Check if an estimated number of bytes fits in what is left of the budget."""
+        return estimate <= self.available()
+
+    def report(self) -> str:
+        """Describe the memory used while the probe was running."""
+
+        def mb(value: int) -> str:
+            return f"{value / 2**20:,.1f} MB"
+
+        if self.traced_peak is not None:
+            report = f"Peak python memory: {mb(self.traced_peak)} of {mb(self.budget)} budget."
+
+        # The process peak only belongs to this run if it grew while the probe was running
+        elif self.peak_start is not None and self.peak_end is not None and self.peak_end > self.peak_start and self.rss_start is not None:
+            report = f"Peak process memory: {mb(self.peak_end)}, {mb(self.peak_end - self.rss_start)} more than at start, {mb(self.budget)} budget."
+        elif self.rss_start is not None and self.rss_end is not None:
+            report = f"Process memory: {mb(self.rss_start)} at start, {mb(self.rss_end)} at end, {mb(self.budget)} budget."
+        else:
+            report = f"Memory budget: {mb(self.budget)}."
+
+        if self.worker_peak is not None:
+            report += f" Peak worker process memory: {mb(self.worker_peak)}."
+
+        return report
+
+#################################################
+# WORKERS
+#################################################
+
+class WorkerCancelled(Exception):
+    """Raised when a tool running in a worker process is cancelled."""
+
+class WorkerError(Exception):
+    """Raised when a tool running in a worker process fails. The message is the traceback from the worker."""
+
+class LayerSource():
+    """
+    A layer or table view described by plain values, so it can be sent to a
+    worker process. Layers only exist in the ArcGIS Pro session that made
+    them, so a worker opens a new layer on the same data with the same
+    definition query and selection.
+    """
+
+    def __init__(self, layer: str) -> None:
+        properties = arcpy.Describe(layer)
+
+        self.layer = layer
+        self.catalog_path = getattr(properties, "catalogPath", layer)
+        self.where_clause = getattr(properties, "whereClause", None) or None
+        self.fid_set = getattr(properties, "FIDSet", None) or None
+        self.is_table = getattr(properties, "dataType", None) in ("TableView", "Table")
+        self.pid = os.getpid()
+        return
+
+    @contextlib.contextmanager
+    def open(self) -> Iterator[Any]:
+        """
+        Yield the original layer in the process that described it, or a new
+        layer that is deleted on exit in any other process.
+        """
+
+        if os.getpid() == self.pid:
+            yield self.layer
+            return
+
+        name = f"{Path(self.catalog_path).stem}_{uuid.uuid4().hex[:8]}"
+        make_layer = arcpy.management.MakeTableView if self.is_table else arcpy.management.MakeFeatureLayer
+        layer = make_layer(self.catalog_path, name, self.where_clause)[0]
+
+        try:
+            if self.fid_set: layer = select_by_oids(layer, [int(oid) for oid in self.fid_set.split(";")])
+            yield layer
+        finally:
+            arcpy.management.Delete(name)
+
+# Connection to the process that started this one, set when this process is a worker started by run_in_worker
+_worker_connection = None
+
+def _worker_main(connection: Any, function: Callable, args: tuple, kwargs: dict[str, Any], record_timings: bool) -> None:
+    """
+    Worker process function that runs a function and sends its messages,
+    progressor updates, timings, peak memory, and result back through a
+    connection.
+    """
+
+    global _worker_connection
+    _worker_connection = connection
+    _message_sink.output = lambda severity, message: connection.send(("message", severity, message))
+
+    # Timings are collected here and written to the log by the process that started the worker
+    log = TimingLog(None, None) if record_timings else None
+    if log is not None: _timing_logs.append(log)
+
+    try:
+        with _message_sink.buffered():
+            outcome = ("result", function(*args, **kwargs))
+    except WorkerCancelled:
+        outcome = ("cancelled", None)
+    except BaseException:
+        outcome = ("error", traceback.format_exc())
+
+    # Send timings and memory before the outcome, the process that started the worker stops reading after it
+    try:
+        if log is not None: connection.send(("timings", log.events))
+        connection.send(("memory", current_rss(peak=True)))
+
+        try:
+            connection.send(outcome)
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+    return
+
+def check_cancelled() -> None:
+    """Raise WorkerCancelled in a worker process if the process that started it asked it to stop."""
+
+    if _worker_connection is not None and _worker_connection.poll() and _worker_connection.recv() == "cancel":
+        raise WorkerCancelled()
+
+    return
+
+def _set_progressor(function_name: str, *args: Any) -> None:
+    """Call an arcpy progressor function, or send the call to the process that started this one in a worker."""
+
+    if _worker_connection is not None:
+        _worker_connection.send(("progressor", function_name, args))
+    else:
+        getattr(arcpy, function_name)(*args)
+
+    return
+
+def run_in_worker(function: Callable, *args: Any, poll_interval: float = 0.1, cancel_timeout: float = 10, memory_probe: MemoryProbe = None, **kwargs: Any) -> Any:
+    """
+    Run a function in a new worker process and return its result. Messages
+    and progressor updates from the worker are written in this process as
+    they arrive. Timings the worker makes are added to the active timing
+    session, and its peak memory to the memory probe if there is one. The
+    function has to be a module level function, and its arguments and result
+    have to be plain values that can be pickled. The worker isn't a daemon,
+    so it can start worker processes of its own.
+
+    If the tool is cancelled the worker is asked to stop, which it does at
+    its next progressor update, and is killed if it hasn't stopped after
+    cancel_timeout seconds. Either way WorkerCancelled is raised. Errors in
+    the worker are raised as WorkerError with the worker's traceback.
+    """
+
+    context = worker_context()
+    connection, worker_connection = context.Pipe()
+    worker = context.Process(target=_worker_main, args=(worker_connection, function, args, kwargs, bool(_timing_logs)), daemon=False)
+    worker.start()
+    worker_connection.close()
+
+    cancelled_at, join_timeout = None, cancel_timeout
+
+    try:
+        with timed("worker", function=function.__name__):
+            while True:
+                # Ask the worker to stop once, then give it time to clean up
+                if cancelled_at is None and getattr(arcpy.env, "isCancelled", False):
+                    connection.send("cancel")
+                    cancelled_at = time.monotonic()
+                elif cancelled_at is not None and time.monotonic() - cancelled_at > cancel_timeout:
+                    join_timeout = 0
+                    raise WorkerCancelled("Worker process did not stop after being cancelled.")
+
+                # Write messages from the worker that have waited in the buffer long enough
+                _message_sink.flush_if_due()
+
+                if not connection.poll(poll_interval):
+                    if not worker.is_alive() and not connection.poll():
+                        raise WorkerError(f"Worker process exited with code {worker.exitcode} without a result.")
+                    continue
+
+                try:
+                    event, *payload = connection.recv()
+                except EOFError:
+                    worker.join(cancel_timeout)
+                    raise WorkerError(f"Worker process exited with code {worker.exitcode} without a result.")
+
+                match event:
+                    case "message":
+                        severity, message = payload
+                        _message_sink.write(message, severity)
+                    case "progressor":
+                        function_name, progressor_args = payload
+                        _set_progressor(function_name, *progressor_args)
+                    case "timings":
+                        if _timing_logs: _timing_logs[-1].merge(payload[0])
+                    case "memory":
+                        if memory_probe is not None: memory_probe.add_worker_peak(payload[0])
+                    case "result":
+                        return payload[0]
+                    case "cancelled":
+                        raise WorkerCancelled("Worker process was cancelled.")
+                    case "error":
+                        raise WorkerError(payload[0])
+    finally:
+        connection.close()
+        worker.join(join_timeout)
+        if worker.is_alive():
+            worker.terminate()
+            worker.join()
+
 #################################################
 # PRINTING
 #################################################
 
+class MessageSink():
+    """
+    Buffers messages for the ArcGIS Pro message queue and stdout. Buffered
+    messages are written together once they reach flush_chars characters,
+    flush_interval seconds after the last write, when the severity changes,
+    or when flush is called, so a tool printing many small messages doesn't
+    pay for a call to arcpy for each one. Warnings and errors are written
+    right away. Messages longer than max_message_chars are split on line
+    breaks into chunks the geoprocessing pane can show.
+
+    Messages are only buffered inside a buffered block, which tools open
+    around execute. Messages written anywhere else, such as during
+    validation or from a script, are written right away. Long loops call
+    flush_if_due as they go, so buffered messages aren't held until the
+    next write.
+    """
+
+    def __init__(self, flush_chars: int = 64_000, flush_interval: float = 0.5, max_message_chars: int = 32_000) -> None:
+        self.flush_chars = flush_chars
+        self.flush_interval = flush_interval
+        self.max_message_chars = max_message_chars
+        self._buffer = []
+        self._buffer_chars = 0
+        self._severity = None
+        self._last_flush = time.monotonic()
+
+        # Writes flushed messages somewhere else instead, called with the severity and the message
+        self.output = None
+
+        # Number of buffered blocks currently open
+        self._depth = 0
+        return
+
+    @contextlib.contextmanager
+    def buffered(self) -> Iterator["MessageSink"]:
+        """Buffer messages written inside the block, and write any left in the buffer when it exits."""
+
+        self._depth += 1
+
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            self.flush()
+
+    def _chunks(self, message: str) -> Iterator[str]:
+        """Split a message into chunks no longer than the max message length, on line breaks where possible."""
+
+        while len(message) > self.max_message_chars:
+            split = message.rfind("\n", 0, self.max_message_chars)
+            if split <= 0: split = self.max_message_chars
+
+            yield message[:split]
+            message = message[split + 1:] if message[split:split + 1] == "\n" else message[split:]
+
+        yield message
+
+    def write(self, message: str, severity: Literal['INFO', 'WARNING', 'ERROR'] = None, stdout: bool = True) -> None:
+        """Add a message to the buffer, writing the buffer if it is due."""
+
+        severity = severity or "INFO"
+
+        # Keep messages in order when the severity changes
+        if self._buffer and severity != self._severity:
+            self.flush()
+
+        self._buffer.append((message, stdout))
+        self._buffer_chars += len(message)
+        self._severity = severity
+
+        if not self._depth or severity != "INFO" or self._buffer_chars >= self.flush_chars:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+        return
+
+    def flush_if_due(self) -> None:
+        """Write the buffer if flush_interval seconds have passed since it was last written."""
+
+        if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+        return
+
+    def flush(self) -> None:
+        """Write every buffered message."""
+
+        if self._buffer and self.output is not None:
+            self.output(self._severity, "\n".join(message for message, _ in self._buffer))
+        elif self._buffer:
+            stdout_text = "\n".join(message for message, stdout in self._buffer if stdout)
+            if stdout_text: print(stdout_text)
+
+            add_message = {"WARNING": arcpy.AddWarning, "ERROR": arcpy.AddError}.get(self._severity, arcpy.AddMessage)
+            for chunk in self._chunks("\n".join(message for message, _ in self._buffer)):
+                add_message(chunk)
+
+        self._buffer = []
+        self._buffer_chars = 0
+        self._last_flush = time.monotonic()
+
+        return
+
+class MessageHistory():
+    """
+    Messages kept by a tool, grouped by severity. Only the most recent
+    max_chars characters of messages are kept, and any single message
+    longer than that is truncated, so printing huge outputs doesn't hold
+    them in memory for the life of the tool.
+    """
+
+    def __init__(self, max_chars: int = 1_000_000) -> None:
+        self.max_chars = max_chars
+        self.total_chars = 0
+        self._messages = deque()
+        return
+
+    def append(self, message: str, severity: Literal['INFO', 'WARNING', 'ERROR'] = "INFO") -> None:
+        """Keep a message, dropping the oldest messages to stay under the limit."""
+
+        message = str(message)
+        if len(message) > self.max_chars: message = f"{message[:self.max_chars - 3]}..."
+
+        self._messages.append((severity, message))
+        self.total_chars += len(message)
+
+        while self.total_chars > self.max_chars:
+            self.total_chars -= len(self._messages.popleft()[1])
+
+        return
+
+    def __getitem__(self, severity: str) -> list[str]:
+        return [message for message_severity, message in self._messages if message_severity == severity]
+
+    def __bool__(self) -> bool:
+        return bool(self._messages)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+# Message sink shared by every tool in the session, with anything still buffered written when the process exits
+_message_sink = MessageSink()
+atexit.register(_message_sink.flush)
+
+def message_sink() -> MessageSink:
+    """Return the message sink shared by every tool."""
+    return _message_sink
+
 def arcprint(*values: object,
              sep: str = " ",
              end: str = "\n",
@@ -209,25 +1380,83 @@ def arcprint(*values: object,
     """
     Print a message to the ArcGIS Pro message queue and stdout set severity
     to 'WARNING' or 'ERROR' to print to the ArcGIS Pro message queue with
-    the appropriate severity
+    the appropriate severity. Messages are buffered by the message sink,
+    set flush to write them right away.
     """
 
-    # Print the message to stdout
-    print(*values, sep=sep, end=end, file=file, flush=flush)
-    
     end = "" if end == '\n' else end
     message = f"{sep.join(map(str, values))}{end}"
-    
-    # Print the message to the ArcGIS Pro message queue with the appropriate severity
-    match severity:
-        case "WARNING":
-            arcpy.AddWarning(f"{message}")
-        case "ERROR":
-            arcpy.AddError(f"{message}")
-        case _:
-            arcpy.AddMessage(f"{message}")
+
+    # Messages meant for another file are printed there right away
+    if file is not None:
+        print(message, file=file, flush=flush)
+
+    # Print the message to the ArcGIS Pro message queue and stdout with the appropriate severity
+    _message_sink.write(message, severity, stdout=file is None)
+    if flush: _message_sink.flush()
+
     return
 
+class Progressor():
+    """
+    Drives the ArcGIS Pro progressor from a loop. Positions are only sent to
+    arcpy when the percent complete changes and at most once per interval
+    in seconds, so updating on every row of a cursor is cheap. Without a
+    total the progressor just shows the label and a running count.
+    """
+
+    def __init__(self, label: str, total: int = None, interval: float = 0.25) -> None:
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self._percent = -1
+        self._last_update = float("-inf")
+        return
+
+    def __enter__(self) -> "Progressor":
+        if self.total:
+            _set_progressor("SetProgressor", "step", self.label, 0, 100, 1)
+        else:
+            _set_progressor("SetProgressor", "default", self.label)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _set_progressor("ResetProgressor")
+        return
+
+    def update(self, count: int = None) -> None:
+        """Set the number of items done, or add one if no count is given."""
+
+        self.count = self.count + 1 if count is None else count
+
+        now = time.monotonic()
+        if now - self._last_update < self.interval: return
+
+        # Workers stop at progressor updates when they are cancelled, and messages buffered during the loop are written
+        check_cancelled()
+        _message_sink.flush_if_due()
+        self._last_update = now
+
+        if self.total:
+            percent = min(100, int(100 * self.count / self.total))
+            if percent == self._percent: return
+
+            _set_progressor("SetProgressorPosition", percent)
+            self._percent = percent
+        else:
+            _set_progressor("SetProgressorLabel", f"{self.label} {self.count:,}")
+
+        return
+
+def progress(iterable: Iterable[Any], label: str, total: int = None) -> Iterator[Any]:
+    """Yield items from an iterable, such as a cursor, while updating the progressor."""
+
+    with Progressor(label, total) as progressor:
+        for item in iterable:
+            yield item
+            progressor.update()
+
 def pretty_format(input_list: list[str], header: str = None, prefix: str = None, sort: bool = True,
                   max_width: int = 100, max_columns: int = 4, min_columns: int = 1, target_len_column: int = 10) -> Iterator[str]:
     """
@@ -8,6 +8,12 @@ def TABS(self, number: int) -> str:
     
     return self.TAB * number
 
+# Name of the tool timing log written to the project folder when instrumentation is turned on
+TIMING_LOG_NAME: str = "FlickTools_timings.jsonl"
+
+# Memory budget for a tool run, in megabytes, when the config doesn't set one
+DEFAULT_MEMORY_BUDGET_MB: int = 2048
+
 # Constants for working with US state names and abbreviations
 STATES: dict[int, int] = {
     'AL': 'Alabama', 'AK': 'Alaska', 'AZ': 'Arizona', 'AR': 'Arkansas', 'CA': 'California', 'CO': 'Colorado', 'CT': 'Connecticut', 'DE': 'Delaware'
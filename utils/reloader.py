@@ -1,7 +1,30 @@
+import os
+import ast
+import sys
+import hashlib
+
+from pathlib import Path
+from types import ModuleType
 from importlib import reload, import_module
+from importlib.util import find_spec
 from traceback import format_exc
+from typing import Any
 from tool import Tool
 
+# Tool attributes that can be read from the tool source without importing it
+MANIFEST_ATTRIBUTES = ("label", "alias", "description", "category", "canRunInBackground")
+
+# Root of the project, only modules loaded from files under it are tracked for reloading
+PROJECT_ROOT = Path(__file__).parents[1].resolve()
+
+# State is kept when this module is reloaded and shared by every toolbox in the process, because
+# reload runs the module again in the same namespace and every .pyt imports the same module
+# Manifests already read this session, keyed by module name with the source file modified time
+_manifests: dict[str, tuple[float, dict[str, Any]]] = globals().get("_manifests", {})
+
+# Source signatures of loaded project modules, keyed by module name as (modified time, size, hash)
+_signatures: dict[str, tuple[int, int, bytes]] = globals().get("_signatures", {})
+
 def placeholder_tool(tool_name: str, exception: Exception, traceback: str) -> type[Tool]:
     """
     Higher order function for creating a tool class that represents a broken
@@ -10,6 +33,9 @@ def placeholder_tool(tool_name: str, exception: Exception, traceback: str) -> ty
     
     class _BrokenImport(Tool):
         __name__ = f"{tool_name}_BrokenImport"
+        broken_import = True
+        import_error = exception
+        import_traceback = traceback
         def __init__(self):
             self.category = "Broken Tools"
             self.label = f"{tool_name}  |  See Tool Properties for Traceback"
@@ -17,12 +43,161 @@ def placeholder_tool(tool_name: str, exception: Exception, traceback: str) -> ty
             self.description = traceback
     return _BrokenImport
 
+def _source_path(module: ModuleType) -> Path | None:
+    """Return the source file of a module if it is part of the project."""
+
+    source = getattr(module, "__file__", None)
+    if not source or not source.endswith(".py"): return None
+
+    path = Path(source).resolve()
+    return path if PROJECT_ROOT in path.parents else None
+
+def _signature(path: Path, previous: tuple[int, int, bytes] | None = None) -> tuple[int, int, bytes]:
+    """
+    Return the modified time, size, and hash of a source file. The file is
+    only hashed when its modified time or size differs from the previous
+    signature.
+    """
+
+    stat = path.stat()
+    if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+        return previous
+
+    return stat.st_mtime_ns, stat.st_size, hashlib.blake2b(path.read_bytes(), digest_size=16).digest()
+
+def track_module(module: ModuleType) -> None:
+    """Record the current source signature of a project module."""
+
+    path = _source_path(module)
+    if path: _signatures[module.__name__] = _signature(path)
+
+    return
+
+def _module_changed(name: str, path: Path) -> bool:
+    """
+    Check if a module's source has changed since it was tracked. Untracked
+    modules start being tracked and count as unchanged, because they were
+    loaded from their current source. Touching a file without changing its
+    contents only updates the signature. A changed signature is only stored
+    by track_module once the module reloads, so a failed reload is retried.
+    """
+
+    previous = _signatures.get(name)
+
+    try:
+        current = _signature(path, previous)
+    except OSError:
+        return False
+
+    if previous is not None and previous[2] != current[2]:
+        return True
+
+    _signatures[name] = current
+
+    return False
+
+def source_changed(module: ModuleType) -> bool:
+    """Check if the source of a loaded project module changed since it was tracked."""
+
+    path = _source_path(module)
+    return bool(path) and _module_changed(module.__name__, path)
+
+def _dependencies(module: ModuleType, project_modules: dict[str, ModuleType]) -> set[str]:
+    """
+    Find the project modules a module depends on from the names in its
+    namespace, covering both "import module" and "from module import name".
+    Submodules bound to a package by the import system aren't dependencies.
+    """
+
+    dependencies = set()
+
+    for value in list(vars(module).values()):
+        name = value.__name__ if isinstance(value, ModuleType) else getattr(value, "__module__", None)
+        if isinstance(name, str) and name in project_modules and name != module.__name__ and not name.startswith(f"{module.__name__}."):
+            dependencies.add(name)
+
+    return dependencies
+
+def reload_changed() -> list[str]:
+    """
+    Reload project modules whose source changed since they were last loaded,
+    along with every module that depends on them. Modules are reloaded after
+    their dependencies so they pick up the new versions. A module that fails
+    to reload is skipped and stays changed, so get_module retries it and
+    returns a broken tool for it. Returns the names of the reloaded modules
+    in the order they were reloaded.
+    """
+
+    project_modules = {
+        name: module for name, module in list(sys.modules.items())
+        if module is not None and _source_path(module)
+    }
+
+    # Find changed modules and build the graph of which modules depend on each one
+    changed = {name for name, module in project_modules.items() if source_changed(module)}
+    dependencies = {name: _dependencies(module, project_modules) for name, module in project_modules.items()}
+    dependents = {name: set() for name in project_modules}
+
+    for name, module_dependencies in dependencies.items():
+        for dependency in module_dependencies:
+            dependents[dependency].add(name)
+
+    # Everything downstream of a changed module has to be reloaded too
+    stale, pending = set(), list(changed)
+
+    while pending:
+        name = pending.pop()
+        if name in stale: continue
+
+        stale.add(name)
+        pending.extend(dependents[name])
+
+    # Reload dependencies before dependents, ignoring cycles
+    order, visited = [], set()
+
+    def visit(name: str) -> None:
+        if name in visited: return
+        visited.add(name)
+
+        for dependency in sorted(dependencies[name] & stale):
+            visit(dependency)
+
+        order.append(name)
+
+    for name in sorted(stale):
+        visit(name)
+
+    reloaded = []
+
+    for name in order:
+        # Catch all exceptions because the module can raise any exception, it is reported when its tool is imported
+        try:
+            track_module(reload(project_modules[name]))
+        except Exception:
+            continue
+
+        reloaded.append(name)
+
+    return reloaded
+
 def get_module(module_name: str) -> type[Tool]:
-    """Attempt to import and reload a tool module."""
+    """
+    Attempt to import a tool module. Modules that are already loaded are
+    only reloaded if their source changed.
+    """
 
     *_, tool = module_name.rsplit(".", 1)
     try:
-        return getattr(reload(import_module(module_name)), tool)
+        module = sys.modules.get(module_name)
+
+        if module is None:
+            module = import_module(module_name)
+            track_module(module)
+        elif source_changed(module):
+            module = reload(module)
+            track_module(module)
+
+        return getattr(module, tool)
     
     # Catch all exceptions beacuse the imported class can raise any exception
     # The placeholder makes this obvious in the ArcGIS Pro GUI and we write the
@@ -42,4 +217,154 @@ def import_tools(tool_dict: dict[str, list[str]], tool_module_name: str = "tools
         get_module(f'{tool_module_name}.{tool_sub_module}.{tool}')
         for tool_sub_module, tools in tool_dict.items()
         for tool in tools
-    ]
\ No newline at end of file
+    ]
+
+def read_manifest(module_name: str) -> dict[str, Any] | None:
+    """
+    Read the label, alias, description, category, and canRunInBackground
+    of a tool from its source file without importing it. Only literal values
+    assigned in the tool's __init__ are read. Returns None if the source
+    can't be found or any of the attributes are missing or aren't literals.
+    """
+
+    *_, tool = module_name.rsplit(".", 1)
+
+    # Finding the spec only imports parent packages, not the tool module
+    try:
+        spec = find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+
+    if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+        return None
+
+    # Skip parsing if the file hasn't changed since it was last read
+    modified = os.path.getmtime(spec.origin)
+    if module_name in _manifests and _manifests[module_name][0] == modified:
+        return _manifests[module_name][1]
+
+    try:
+        with open(spec.origin, encoding="utf-8") as infile:
+            module = ast.parse(infile.read(), spec.origin)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    # Pull literal self.<attribute> assignments out of the tool class __init__
+    manifest = {}
+
+    for node in module.body:
+        if not (isinstance(node, ast.ClassDef) and node.name == tool): continue
+
+        for method in node.body:
+            if not (isinstance(method, ast.FunctionDef) and method.name == "__init__"): continue
+
+            for statement in ast.walk(method):
+                if not (isinstance(statement, ast.Assign) and len(statement.targets) == 1): continue
+
+                target = statement.targets[0]
+                if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == "self" and target.attr in MANIFEST_ATTRIBUTES:
+                    try:
+                        manifest[target.attr] = ast.literal_eval(statement.value)
+                    except ValueError:
+                        return None
+
+    # The base class decides canRunInBackground if the tool doesn't
+    manifest.setdefault("canRunInBackground", False)
+    if any(attribute not in manifest for attribute in MANIFEST_ATTRIBUTES):
+        return None
+
+    _manifests[module_name] = (modified, manifest)
+
+    return manifest
+
+def lazy_tool(module_name: str, manifest: dict[str, Any]) -> type:
+    """
+    Higher order function for creating a lightweight proxy for a tool class.
+    The proxy carries the attributes in the manifest so the tool can be
+    listed in a toolbox, and only imports the real tool the first time
+    ArcGIS Pro opens, validates, or runs it. Every proxy instance creates its
+    own instance of the real tool, just like ArcGIS Pro does with real tools.
+    If the real tool can't be imported, the proxy takes the label and
+    traceback of the broken tool placeholder and raises the import error.
+    """
+
+    *_, tool_name = module_name.rsplit(".", 1)
+
+    class _LazyTool():
+        _module_name = module_name
+        _tool_class = None
+
+        def __init__(self) -> None:
+            self.__dict__.update(manifest)
+            self._tool = None
+            return
+
+        @classmethod
+        def _load_class(cls) -> type[Tool]:
+            """Import the real tool class the first time it is needed."""
+
+            if cls._tool_class is None:
+                cls._tool_class = get_module(cls._module_name)
+
+            return cls._tool_class
+
+        def _load(self) -> Tool:
+            """
+            Create an instance of the real tool the first time it is needed.
+            Raise the import error if the tool is broken.
+            """
+
+            tool_class = self._load_class()
+
+            # Show the broken tool in place of the manifest so the traceback reaches the user
+            if getattr(tool_class, "broken_import", False):
+                broken_tool = tool_class()
+                self.__dict__.update(category=broken_tool.category, label=broken_tool.label, alias=broken_tool.alias, description=broken_tool.description)
+                raise ImportError(f"{tool_name} could not be imported.\n{tool_class.import_traceback}") from tool_class.import_error
+
+            if self._tool is None:
+                self._tool = tool_class()
+
+            return self._tool
+
+        def getParameterInfo(self) -> list:
+            return self._load().getParameterInfo()
+
+        def isLicensed(self) -> bool:
+            return self._load().isLicensed()
+
+        def updateParameters(self, parameters: list) -> None:
+            return self._load().updateParameters(parameters)
+
+        def updateMessages(self, parameters: list) -> None:
+            return self._load().updateMessages(parameters)
+
+        def execute(self, parameters: list, messages: list) -> None:
+            return self._load().execute(parameters, messages)
+
+        def postExecute(self, parameters: list) -> None:
+            return self._load().postExecute(parameters)
+
+    _LazyTool.__name__ = _LazyTool.__qualname__ = tool_name
+
+    return _LazyTool
+
+def lazy_import_tools(tool_dict: dict[str, list[str]], tool_module_name: str = "tools") -> list[type]:
+    """
+    Create lazy proxies for all tools from the provided dictionary. Tools
+    whose manifest can't be read from their source are imported right away
+    instead, which also surfaces any import errors as a broken tool. Default
+    base module name is "tools".
+
+    Expected format: {"module": ["tool1", "tool2", ...], ...}
+    """
+
+    tools = []
+
+    for tool_sub_module, tool_names in tool_dict.items():
+        for tool in tool_names:
+            module_name = f"{tool_module_name}.{tool_sub_module}.{tool}"
+            manifest = read_manifest(module_name)
+            tools.append(lazy_tool(module_name, manifest) if manifest else get_module(module_name))
+
+    return tools
@@ -1,16 +1,249 @@
 import arcpy
 import os
+import time
 import random
+import tempfile
+import functools
 
-from typing import Any, Literal
+from typing import Any, Callable, Literal
 from abc import ABC
-from collections import defaultdict
+from importlib import import_module
+from collections import OrderedDict
 
 import utils.archelp as archelp
 import utils.constants as constants
 
+class SessionContext():
+    """
+    Project and config values shared by every tool in the process. Each
+    value is computed the first time it is used and cached until the active
+    project changes. ArcGIS Pro creates tools constantly during validation,
+    so the project is checked for changes at most once per revalidate
+    interval, in seconds. The config checks its own file for changes and
+    never opens the project. Processes without a current project, such as
+    worker processes and standalone scripts, get None for project values.
+    """
+
+    def __init__(self, config_path: os.PathLike, revalidate_interval: float = 1.0) -> None:
+        self.config_path = config_path
+        self.revalidate_interval = revalidate_interval
+        self._values = {}
+        self._project_key = None
+        self._checked = float("-inf")
+        return
+
+    def _project_fingerprint(self, project: arcpy.mp.ArcGISProject) -> tuple[str, str, str]:
+        """Values that identify the project and where tools write by default."""
+        return project.filePath, project.homeFolder, project.defaultGeodatabase
+
+    def _current_project(self) -> arcpy.mp.ArcGISProject | None:
+        """Open the current project, or return None if this process doesn't have one."""
+
+        try:
+            return arcpy.mp.ArcGISProject("CURRENT")
+        except (OSError, RuntimeError):
+            return None
+
+    def _revalidate(self) -> None:
+        """Drop cached values if the active project changed."""
+
+        if time.monotonic() - self._checked < self.revalidate_interval:
+            return
+
+        # Open the current project again and start over if it isn't the one the values came from
+        project = self._current_project()
+        project_key = self._project_fingerprint(project) if project else None
+
+        if project_key != self._project_key or "project" not in self._values:
+            self._values = {"project": project}
+            self._project_key = project_key
+
+        self._checked = time.monotonic()
+
+        return
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Return a cached value, computing it first if needed."""
+
+        self._revalidate()
+
+        if name not in self._values:
+            self._values[name] = factory()
+
+        return self._values[name]
+
+    def invalidate(self) -> None:
+        """Drop every cached value so each is computed again when next used."""
+
+        self._values = {}
+        self._project_key = None
+        self._checked = float("-inf")
+
+        return
+
+    @property
+    def project(self) -> arcpy.mp.ArcGISProject:
+        return self._get("project", self._current_project)
+
+    @property
+    def project_location(self) -> str:
+        return self._get("project_location", lambda: self.project.homeFolder if self.project else None)
+
+    @property
+    def project_name(self) -> str:
+        return self._get("project_name", lambda: os.path.basename(self.project_location) if self.project_location else None)
+
+    @property
+    def default_gdb(self) -> str:
+        return self._get("default_gdb", lambda: self.project.defaultGeodatabase if self.project else None)
+
+    @property
+    def databases(self) -> list[dict[str, Any]]:
+        return self._get("databases", lambda: self.project.databases if self.project else [])
+
+    @property
+    def ft_config(self) -> archelp.ToolboxConfig:
+        # Config values don't depend on the project, so reading them skips project revalidation
+        return archelp.ToolboxConfig(self.config_path)
+
+# Context shared by every tool in the process
+_session_context: SessionContext | None = None
+
+def session_context() -> SessionContext:
+    """Return the session context shared by every tool, creating it the first time."""
+
+    global _session_context
+
+    if _session_context is None:
+        _session_context = SessionContext(archelp.toolbox_abspath(r"utils\configs\FlickTools_config.json"))
+
+    return _session_context
+
+# Results of validation steps shared by every instance of a tool, keyed by tool class and step name
+_validation_cache: dict[tuple[type, str], OrderedDict[tuple[Any, ...], tuple[float, Any]]] = {}
+
+def validation_step(*parameter_names: str, max_entries: int = 32, max_age: float | None = None) -> Callable:
+    """
+    Decorator for a tool method that computes something during validation
+    from the values of the named parameters. The decorated method is called
+    with the parameters and receives the value of each named parameter as
+    text instead.
+
+    Results are memoized per tool class, because ArcGIS Pro creates a new
+    tool instance for most validation passes. The least recently used result
+    is dropped once a step has more than max_entries results, and results
+    older than max_age seconds are computed again. Exceptions aren't cached,
+    so a failed step is tried again the next time it is called.
+    """
+
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, parameters: list[arcpy.Parameter]) -> Any:
+            parameters = parameters if isinstance(parameters, archelp.Parameters) else archelp.Parameters(parameters)
+            values = tuple(parameters[name].valueAsText for name in parameter_names)
+            cache = _validation_cache.setdefault((type(self), method.__name__), OrderedDict())
+
+            # Use the memoized result if it is still fresh
+            if values in cache:
+                created, result = cache[values]
+                if max_age is None or time.monotonic() - created < max_age:
+                    cache.move_to_end(values)
+                    return result
+
+            result = method(self, *values)
+            cache[values] = (time.monotonic(), result)
+            cache.move_to_end(values)
+
+            while len(cache) > max_entries:
+                cache.popitem(last=False)
+
+            return result
+        return wrapper
+    return decorator
+
+def clear_validation_cache(tool: type | None = None) -> None:
+    """Drop memoized validation results for one tool class, or for every tool."""
+
+    for key in [key for key in _validation_cache if tool is None or key[0] is tool]:
+        del _validation_cache[key]
+
+    return
+
+def _instrumented(method: Callable) -> Callable:
+    """
+    Wrap a tool method so it is timed when instrumentation is turned on in
+    the config. Timings made with archelp.timed while the method runs, such
+    as REST requests and geoprocessing calls, are nested under it.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs) -> Any:
+        if not self.ft_config.value("enable_instrumentation"):
+            return method(self, *args, **kwargs)
+
+        with archelp.timing_session(self.timing_log_path, getattr(self, "alias", type(self).__name__)), archelp.timed(method.__name__):
+            return method(self, *args, **kwargs)
+
+    wrapper._instrumented = True
+    return wrapper
+
+def _memory_tracked(method: Callable) -> Callable:
+    """
+    Wrap a tool's execute method with a memory probe using the budget from
+    the config, report the memory used when it finishes, and write any
+    messages still in the message sink.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs) -> Any:
+        # Buffered messages are always written before the tool finishes, even if it fails
+        with archelp.message_sink().buffered():
+            with archelp.MemoryProbe(self.memory_budget, trace=bool(self.ft_config.value("trace_memory"))) as probe:
+                self.memory = probe
+                result = method(self, *args, **kwargs)
+
+            archelp.arcprint(probe.report())
+
+        return result
+
+    wrapper._memory_tracked = True
+    return wrapper
+
+def _run_tool_method(module_name: str, class_name: str, method_name: str, memory_budget: int, args: tuple, kwargs: dict[str, Any]) -> Any:
+    """
+    Worker process function that creates a tool and runs one of its methods.
+    The tool's memory probe gets what was left of the budget in the process
+    that started the worker.
+    """
+
+    tool = getattr(import_module(module_name), class_name)()
+
+    with archelp.MemoryProbe(memory_budget) as probe:
+        tool.memory = probe
+        return getattr(tool, method_name)(*args, **kwargs)
+
 class Tool(ABC):
     """Base class for all tools."""
+
+    # Tool methods that are timed when instrumentation is turned on
+    timed_methods = ("getParameterInfo", "updateParameters", "updateMessages", "execute", "postExecute")
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        """Wrap the timed methods each tool defines so they can be instrumented."""
+
+        super().__init_subclass__(**kwargs)
+
+        # Track memory inside the timing so the timing includes the whole run
+        execute = cls.__dict__.get("execute")
+        if callable(execute) and not getattr(execute, "_memory_tracked", False) and not getattr(execute, "_instrumented", False):
+            setattr(cls, "execute", _memory_tracked(execute))
+
+        for name in cls.timed_methods:
+            method = cls.__dict__.get(name)
+            if callable(method) and not getattr(method, "_instrumented", False):
+                setattr(cls, name, _instrumented(method))
+
+        return
     
     def __init__(self) -> None:
         """Base tool."""
@@ -20,19 +253,76 @@ class Tool(ABC):
         self.description = "Base class for all tools"
         self.canRunInBackground = False
         self.category = "Unassigned"
-        self.ft_config = archelp.ToolboxConfig(archelp.toolbox_abspath(r"utils\configs\FlickTools_config.json"))
-        self.tool_messages = defaultdict(list)
-        
-        # Project variables
-        self.project = arcpy.mp.ArcGISProject("CURRENT")
-        self.project_location = self.project.homeFolder
-        self.project_name = os.path.basename(self.project_location)
-        
-        # Database variables
-        self.default_gdb = self.project.defaultGeodatabase
-        self.databases = self.project.databases
+        self.tool_messages = archelp.MessageHistory()
+
+        # Project, database, and config values are shared by every tool and only read when used
+        self.context = session_context()
+
+        # Memory probe for the current run, set while execute runs
+        self.memory = None
 
         return
+
+    @property
+    def ft_config(self) -> archelp.ToolboxConfig:
+        return self.context.ft_config
+
+    @property
+    def project(self) -> arcpy.mp.ArcGISProject:
+        return self.context.project
+
+    @property
+    def project_location(self) -> str:
+        return self.context.project_location
+
+    @property
+    def project_name(self) -> str:
+        return self.context.project_name
+
+    @property
+    def default_gdb(self) -> str:
+        return self.context.default_gdb
+
+    @property
+    def databases(self) -> list[dict[str, Any]]:
+        return self.context.databases
+
+    @property
+    def timing_log_path(self) -> str:
+        return os.path.join(self.project_location or tempfile.gettempdir(), constants.TIMING_LOG_NAME)
+
+    @property
+    def memory_budget(self) -> int:
+        return int((self.ft_config.value("memory_budget_mb") or constants.DEFAULT_MEMORY_BUDGET_MB) * 2**20)
+
+    def _fits_in_memory(self, estimate: int) -> bool:
+        """Check if an estimated number of bytes fits in what is left of the memory budget."""
+        return self.memory.fits(estimate) if self.memory else estimate <= self.memory_budget
+
+    @property
+    def run_out_of_process(self) -> bool:
+        return bool(self.canRunInBackground and self.ft_config.value("run_out_of_process"))
+
+    def _run_step(self, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Run the heavy part of execute. Background safe tools run it in a
+        worker process when out of process execution is turned on in the
+        config, so ArcGIS Pro stays responsive and other tools can run at the
+        same time. The method's arguments and result are sent between
+        processes, so they have to be plain values, with layers passed as
+        archelp.LayerSource. Timings and peak memory from the worker are
+        added to this run's timing log and memory report.
+        """
+
+        if not self.run_out_of_process:
+            return method(*args, **kwargs)
+
+        memory_budget = self.memory.available() if self.memory else self.memory_budget
+        return archelp.run_in_worker(_run_tool_method, type(self).__module__, type(self).__name__, method.__name__, memory_budget, args, kwargs, memory_probe=self.memory)
+
+    def _scratch_workspace(self) -> archelp.ScratchWorkspace:
+        """Create a scratch workspace that keeps intermediates in memory while they fit in what is left of the budget."""
+        return archelp.ScratchWorkspace(self.memory.available() if self.memory else self.memory_budget)
     
     def _add_tool_message(self, message, severity: Literal['INFO', 'WARNING', 'ERROR'] = 'INFO') -> None:
         """
@@ -41,7 +331,7 @@ class Tool(ABC):
         """
 
         # Append message to tool message and call arcprint to print the message
-        self.tool_messages[severity].append(message)
+        self.tool_messages.append(message, severity)
         archelp.arcprint(message, severity=severity)
 
         return